@@ -9,6 +9,7 @@ import json
 
 class ConfigurationParser():
     __instance = None
+    __no_default = object()
 
     @staticmethod
     def get_instance():
@@ -16,14 +17,39 @@ class ConfigurationParser():
             ConfigurationParser()
         return ConfigurationParser.__instance
 
-    def __init__(self):
+    def __init__(self, parameters=None):
+        """
+        The parameters are read from the dash_client.json file, unless a dict
+        of parameters is given (e.g. by the batch runner).
+        """
         if ConfigurationParser.__instance is not None:
             raise Exception('This class is a singleton!')
+        else:
+            self.load_parameters(parameters)
+            ConfigurationParser.__instance = self
+
+    @staticmethod
+    def create(parameters=None):
+        """
+        It returns a new ConfigurationParser that is not shared by the process (see base.session.Session).
+        """
+        config_parser = ConfigurationParser.__new__(ConfigurationParser)
+        config_parser.load_parameters(parameters)
+        return config_parser
+
+    def load_parameters(self, parameters=None):
+        if parameters is not None:
+            self.config_parameters = dict(parameters)
         else:
             with open('dash_client.json') as f:
                 self.config_parameters = json.load(f)
 
-            ConfigurationParser.__instance = self
-
-    def get_parameter(self, key):
+    def get_parameter(self, key, default=__no_default):
+        """
+        Returns the value of a configuration parameter. If a default value is
+        given, it is returned when the parameter is not defined in the
+        configuration file; otherwise a missing parameter raises KeyError.
+        """
+        if default is not ConfigurationParser.__no_default and key not in self.config_parameters:
+            return default
         return self.config_parameters[key]
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+A structured event log for the session, used instead of print() in the
+per segment code paths.
+
+Each event has a level (DEBUG, INFO, WARNING and ERROR, as in the logging
+module), a name (e.g. segment_request), the module that logged it and its
+fields. An event below the levels of both outputs is discarded by the
+first comparison of the call, before anything is formatted:
+
+    self.event_log.debug('buffer_size', 'Execution Time {time} > buffer size: {buffer_size}', buffer_size=buffer_size)
+
+The text is a str.format() template of the fields (and of the time of the
+event) and is formatted only for the console. The callers that would
+compute an expensive field should check is_enabled() first.
+
+Outputs:
+
+    console  events at or above log_console_level are printed, as the
+             print() calls used to do
+    file     events at or above log_file_level are appended to a ring
+             (a deque of log_ring_size records) and written to log_file as
+             JSON lines by a background thread, every log_flush_interval
+             seconds or when the ring is half full. If the writer can't
+             keep up the oldest records are dropped and counted.
+"""
+
+import atexit
+import collections
+import json
+import os
+import threading
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+DISABLED = 100
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR, 'off': DISABLED}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+# the field values kept as they are, other values are stored as str
+PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def get_level(name, parameter):
+    level = LEVELS.get(str(name).lower())
+    if level is None:
+        raise ValueError(f'Invalid {parameter} parameter - {name}. It should be one of {", ".join(LEVELS)}.')
+    return level
+
+
+class EventLog:
+
+    def __init__(self, config_parser, timer):
+        self.timer = timer
+
+        self.console_level = get_level(config_parser.get_parameter('log_console_level', 'debug'), 'log_console_level')
+
+        self.file_name = config_parser.get_parameter('log_file', '')
+        self.file_level = DISABLED
+        if self.file_name:
+            self.file_level = get_level(config_parser.get_parameter('log_file_level', 'debug'), 'log_file_level')
+
+        # the lowest level written anywhere
+        self.level = min(self.console_level, self.file_level)
+
+        self.ring_size = int(config_parser.get_parameter('log_ring_size', 65536))
+        # appending to a full ring drops its oldest record, the writer thread drains it
+        # concurrently, so nothing checks the length before appending
+        self.ring = collections.deque(maxlen=self.ring_size)
+        # records appended, the ones written are counted by the writer thread
+        self.appended = 0
+        self.written = 0
+        self.flush_interval = float(config_parser.get_parameter('log_flush_interval', 0.5))
+        self.dropped = 0
+
+        self.file = None
+        self.writer_thread = None
+        self.writer_event = threading.Event()
+        self.closed = False
+
+    def get_logger(self, module):
+        return ModuleLog(self, module)
+
+    def is_enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, module, event, text, fields):
+        if level < self.level:
+            return
+
+        time = self.timer.get_current_time()
+
+        if level >= self.console_level:
+            print(text.format(time=time, **fields))
+
+        if level >= self.file_level:
+            self.append(level, module, event, time, fields)
+
+    def append(self, level, module, event, time, fields):
+        # the values are copied now, the logged objects (e.g. pooled messages) may change later
+        record = {'time': time, 'level': LEVEL_NAMES[level], 'module': module, 'event': event}
+        for key, value in fields.items():
+            record[key] = value if isinstance(value, PLAIN_TYPES) else str(value)
+
+        if self.writer_thread is None:
+            self.start_writer()
+
+        self.ring.append(record)
+        self.appended += 1
+
+        if len(self.ring) >= self.ring_size // 2:
+            self.writer_event.set()
+
+    def start_writer(self):
+        directory = os.path.dirname(self.file_name)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.file_name, 'w', buffering=1 << 20)
+
+        self.writer_thread = threading.Thread(target=self.write_records, daemon=True)
+        self.writer_thread.start()
+
+        # the records are written even if a module ends the session with exit()
+        atexit.register(self.close)
+
+    def write_records(self):
+        while not self.closed:
+            self.writer_event.wait(self.flush_interval)
+            self.writer_event.clear()
+            self.flush()
+
+    def flush(self):
+        lines = []
+        try:
+            while True:
+                lines.append(json.dumps(self.ring.popleft()))
+        except IndexError:
+            pass
+        self.written += len(lines)
+
+        if lines:
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.writer_thread is None:
+            return
+
+        self.writer_event.set()
+        self.writer_thread.join()
+        self.flush()
+
+        # after the last flush every record appended was either written or dropped
+        self.dropped = self.appended - self.written
+        if self.dropped > 0:
+            self.file.write(json.dumps({'time': self.timer.get_current_time(), 'level': 'warning',
+                                        'module': 'EventLog', 'event': 'records_dropped',
+                                        'count': self.dropped}) + '\n')
+        self.file.close()
+
+
+class ModuleLog:
+    """
+    The EventLog of a module: the events are logged with the module name.
+    """
+    __slots__ = ('event_log', 'module')
+
+    def __init__(self, event_log, module):
+        self.event_log = event_log
+        self.module = module
+
+    def is_enabled(self, level):
+        return level >= self.event_log.level
+
+    def debug(self, event, text, **fields):
+        if DEBUG >= self.event_log.level:
+            self.event_log.log(DEBUG, self.module, event, text, fields)
+
+    def info(self, event, text, **fields):
+        if INFO >= self.event_log.level:
+            self.event_log.log(INFO, self.module, event, text, fields)
+
+    def warning(self, event, text, **fields):
+        if WARNING >= self.event_log.level:
+            self.event_log.log(WARNING, self.module, event, text, fields)
+
+    def error(self, event, text, **fields):
+        if ERROR >= self.event_log.level:
+            self.event_log.log(ERROR, self.module, event, text, fields)
@@ -3,6 +3,10 @@
 @author: Marcos F. Caetano (mfcaetano@unb.br) 11/03/2020
 
 @description: PyDash Project
+
+The messages are slotted objects (no __dict__). Using the message_pool
+parameter the Player reuses its segment messages through a SSMessagePool
+once it has consumed the responses.
 """
 
 from enum import Enum
@@ -17,10 +21,13 @@ class MessageKind(Enum):
 
 
 class Message:
+    __slots__ = ('payload', 'kind', 'bit_length', 'parsed_mpd')
+
     def __init__(self, kind, payload):
         self.payload = payload
         self.kind = kind
         self.bit_length = 0
+        self.parsed_mpd = None
 
     def get_payload(self):
         return self.payload
@@ -37,9 +44,21 @@ class Message:
     def get_bit_length(self):
         return self.bit_length
 
+    def add_parsed_mpd(self, parsed_mpd):
+        self.parsed_mpd = parsed_mpd
+
+    def get_parsed_mpd(self):
+        """
+        It returns the parsed MPD file (player.parser.mpd_node) of a XML_RESPONSE message.
+        It is shared by all the modules and must not be changed.
+        """
+        return self.parsed_mpd
+
 
 # Segment Size Message
 class SSMessage(Message):
+    __slots__ = ('path_name', 'media_mpd', 'host_name', 'quality_id', 'segment_id', 'segment_duration', 'url_builder',
+                 'chunk_arrivals', '__found')
 
     def __init__(self, kind, payload=None):
 
@@ -50,6 +69,9 @@ class SSMessage(Message):
         self.host_name = ''
         self.quality_id = 0
         self.segment_id = 0
+        self.segment_duration = None
+        self.url_builder = None
+        self.chunk_arrivals = []
         self.__found = True
 
     def __str__(self):
@@ -62,6 +84,9 @@ class SSMessage(Message):
         self.host_name = host_name
 
     def get_host_name(self):
+        # the BaseURL of the representation may point to another host
+        if self.url_builder is not None:
+            return self.url_builder.get_host_name(self.quality_id)
         return self.host_name
 
     def add_segment_id(self, segment_id):
@@ -70,7 +95,17 @@ class SSMessage(Message):
     def get_segment_id(self):
         return self.segment_id
 
+    def add_segment_duration(self, segment_duration):
+        self.segment_duration = segment_duration
+
     def get_segment_size(self):
+        """
+        It returns the segment duration (s), from the MPD SegmentTemplate or, if the
+        MPD doesn't define it, from the path name (e.g. .../2sec/...).
+        """
+        if self.segment_duration is not None:
+            return self.segment_duration
+
         for i in self.path_name.split('/'):
             if 'sec' in i:
                 return int(i.split('sec')[0])
@@ -78,12 +113,26 @@ class SSMessage(Message):
     def add_media_mpd(self, media_mpd):
         self.media_mpd = media_mpd
 
+    def add_url_builder(self, url_builder):
+        self.url_builder = url_builder
+
     def add_quality_id(self, quality_id):
         self.quality_id = quality_id
 
     def get_quality_id(self):
         return self.quality_id
 
+    def add_chunk_arrivals(self, chunk_arrivals):
+        self.chunk_arrivals = chunk_arrivals
+
+    def get_chunk_arrivals(self):
+        """
+        It returns a list of (time, bytes) of each chunk of the segment received by the
+        ConnectionHandler, where time is the number of seconds since the request was sent.
+        It is empty for segments that were not downloaded (cached or replayed).
+        """
+        return self.chunk_arrivals
+
     def set_found(self, status=True):
         self.__found = status
 
@@ -91,6 +140,34 @@ class SSMessage(Message):
         return bool(self.bit_length > 0 and self.__found)
 
     def get_url(self):
-        self.media_mpd = self.media_mpd.replace('$Bandwidth$', str(self.quality_id))
-        self.media_mpd = self.media_mpd.replace('$Number$', str(self.segment_id))
-        return self.path_name + '/' + self.media_mpd
+        """
+        It returns the segment url of the chosen quality_id. The message is not changed.
+        """
+        if self.url_builder is not None:
+            return self.url_builder.get_media_url(self.quality_id, self.segment_id)
+
+        media = self.media_mpd.replace('$Bandwidth$', str(self.quality_id)).replace('$Number$', str(self.segment_id))
+        return self.path_name + '/' + media
+
+
+class SSMessagePool:
+    """
+    A free list of SSMessage objects. A message released to the pool must not be
+    used anymore by any module.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.free = []
+
+    def acquire(self, kind, payload=None):
+        if not self.free:
+            return SSMessage(kind, payload)
+
+        msg = self.free.pop()
+        msg.__init__(kind, payload)
+        return msg
+
+    def release(self, msg):
+        if len(self.free) < self.max_size:
+            self.free.append(msg)
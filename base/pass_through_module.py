@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+A module that forwards every message: requests go down and responses go
+up, unchanged. It is the base class of the layers that can be inserted in
+the module stack (module_stack parameter) to observe or change the
+messages, e.g. between the R2A and the ConnectionHandler:
+
+    "module_stack": ["Player", "R2A", "my_package.my_layer.MyLayer", "ConnectionHandler"]
+
+A layer overrides only the handlers it is interested in.
+"""
+
+from base.simple_module import SimpleModule
+
+
+class PassThroughModule(SimpleModule):
+
+    def __init__(self, id, session=None):
+        SimpleModule.__init__(self, id, session)
+
+    def initialize(self):
+        pass
+
+    def finalization(self):
+        pass
+
+    def handle_xml_request(self, msg):
+        self.send_down(msg)
+
+    def handle_xml_response(self, msg):
+        self.send_up(msg)
+
+    def handle_segment_size_request(self, msg):
+        self.send_down(msg)
+
+    def handle_segment_size_response(self, msg):
+        self.send_up(msg)
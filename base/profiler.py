@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+Handler profiling: the time spent by each module handling each kind of
+message.
+
+With the profile parameter the DashClient times every message dispatch
+(handle_message()) and adds it to a latency histogram of the pair (module,
+MessageKind). The histograms have one bucket per power of two nanoseconds,
+so adding a sample is O(1) and the percentiles are estimated with a factor
+of two of precision. The time not spent in any handler (scheduler, module
+initialization and finalization) is reported as 'other'.
+
+At the end of the session the report is printed and written to
+profile.json in the results directory.
+"""
+
+import json
+import os
+
+
+class LatencyHistogram:
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        # buckets[i] counts the samples in [2 ** (i - 1), 2 ** i) ns
+        self.buckets = [0] * 64
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if ns > self.max:
+            self.max = ns
+        self.buckets[min(ns.bit_length(), 63)] += 1
+
+    def get_percentile(self, q):
+        """
+        It returns the upper bound (s) of the bucket of the q (0 to 1) percentile.
+        """
+        target = q * self.count
+        accumulated = 0
+        for i, count in enumerate(self.buckets):
+            accumulated += count
+            if count and accumulated >= target:
+                return min(2 ** i, self.max) / 1e9
+        return self.max / 1e9
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total / 1e9,
+            'mean': self.total / self.count / 1e9 if self.count else 0,
+            'min': (self.min or 0) / 1e9,
+            'p50': self.get_percentile(0.5),
+            'p90': self.get_percentile(0.9),
+            'p99': self.get_percentile(0.99),
+            'max': self.max / 1e9,
+            # samples by power of two ns, the trailing empty buckets are dropped
+            'histogram_ns_log2': self.buckets[:max((i + 1 for i, count in enumerate(self.buckets) if count), default=0)],
+        }
+
+
+class HandlerProfiler:
+
+    def __init__(self):
+        # (module id, module name, MessageKind name) -> LatencyHistogram
+        self.histograms = {}
+
+    def add(self, module, kind, ns):
+        key = (module.id, module.__class__.__name__, kind.name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.add(ns)
+
+    def get_report(self, session_time):
+        """
+        It returns the histograms as a list of dicts, the most expensive (module, kind) first.
+        """
+        report = []
+        for (id, module, kind), histogram in self.histograms.items():
+            item = {'module': module, 'id': id, 'kind': kind}
+            item.update(histogram.to_dict())
+            report.append(item)
+        report.sort(key=lambda item: item['total'], reverse=True)
+
+        handlers_time = sum(item['total'] for item in report)
+        return {'session_time': session_time, 'handlers_time': handlers_time,
+                'other_time': max(session_time - handlers_time, 0), 'handlers': report}
+
+    def print_report(self, report):
+        print(f'Handler profile (session time: {report["session_time"]:.3f}s):')
+        for item in report['handlers']:
+            print(f'> {item["module"]} {item["kind"]}: {item["count"]} messages, total {item["total"]:.4f}s, '
+                  f'mean {item["mean"] * 1e6:.1f}us, p99 {item["p99"] * 1e6:.1f}us, max {item["max"] * 1e6:.1f}us')
+        print(f'> other: total {report["other_time"]:.4f}s')
+
+    def save(self, report, results_dir):
+        os.makedirs(results_dir, exist_ok=True)
+        with open(os.path.join(results_dir, 'profile.json'), 'w') as f:
+            json.dump(report, f, indent=4)
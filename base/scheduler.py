@@ -5,8 +5,18 @@
 @description: PyDash Project
 
 The Scheduler is a Singleton class implementation
+
+Events are kept in a binary heap ordered by (time, priority, insertion
+order), so events scheduled to the same time and priority are delivered
+in FIFO order. Adding and getting an event are O(log n) operations.
+Cancelled events (SchedulerEvent.cancel() or Scheduler.cancel_event()) are
+discarded lazily when they reach the top of the heap, so the scheduler is
+empty when the heap has no event that is not cancelled.
 """
 
+import heapq
+import itertools
+
 from base.singleton import Singleton
 
 
@@ -14,12 +24,46 @@ class Scheduler(metaclass=Singleton):
 
     def __init__(self):
         self.events = []
+        self.sequence = itertools.count()
+
+        # simulation time of the last delivered event
+        self.current_time = 0
+
+    def add_event(self, event, delay=0):
+        """
+        Schedules an event. If the event has no time defined it is delivered
+        'delay' seconds after the current scheduler time.
+        """
+        if event.time is None:
+            event.time = self.current_time + delay
+        elif event.time < self.current_time:
+            raise ValueError(f'It is not possible to schedule an event in the past ({event.time} < {self.current_time}).')
 
-    def add_event(self, event):
-        self.events.append(event)
+        heapq.heappush(self.events, (event.time, event.priority, next(self.sequence), event))
+        event.scheduled = True
+        return event
+
+    def cancel_event(self, event):
+        event.cancel()
+
+    # it removes the cancelled events from the top of the heap
+    def discard_cancelled_events(self):
+        while self.events and self.events[0][3].is_cancelled():
+            heapq.heappop(self.events)[3].scheduled = False
 
     def get_event(self):
-        return self.events.pop(0)
+        self.discard_cancelled_events()
+        if not self.events:
+            raise IndexError('There is no event to deliver, the scheduler is empty.')
+
+        event = heapq.heappop(self.events)[3]
+        event.scheduled = False
+        self.current_time = event.time
+        return event
+
+    def get_current_time(self):
+        return self.current_time
 
     def is_empty(self):
-        return bool(self.events == [])
+        self.discard_cancelled_events()
+        return not self.events
@@ -3,16 +3,30 @@
 @author: Marcos F. Caetano (mfcaetano@unb.br) 11/03/2020
 
 @description: PyDash Project
+
+An event handled by the Scheduler. Besides the message and the
+source/destination modules, an event carries the simulation time
+it must be delivered at and a priority used to break ties between
+events scheduled to the same time (lower values are delivered first).
 """
 
 
 class SchedulerEvent:
+    __slots__ = ('origin', 'destination', 'msg', 'time', 'priority', 'cancelled', 'scheduled')
 
-    def __init__(self, msg, src, dst):
+    def __init__(self, msg, src, dst, time=None, priority=0):
         self.origin = src
         self.destination = dst
         self.msg = msg
 
+        # None means "as soon as possible" (the current scheduler time)
+        self.time = time
+        self.priority = priority
+        self.cancelled = False
+
+        # True while the event is waiting in the scheduler queue
+        self.scheduled = False
+
     def get_src(self):
         return self.origin
 
@@ -21,3 +35,18 @@ class SchedulerEvent:
 
     def get_msg(self):
         return self.msg
+
+    def get_time(self):
+        return self.time
+
+    def get_priority(self):
+        return self.priority
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def is_scheduled(self):
+        return self.scheduled
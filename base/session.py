@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+A Session owns the services used by the modules of a single DashClient:
+the ConfigurationParser, the Scheduler, the Timer, the Whiteboard and the
+EventLog.
+
+The default session is made of the process-wide singletons (the objects
+returned by get_instance()), so the existing code keeps working. Sessions
+created by Session.create() have their own services, which allows many
+DashClients to run in the same process without sharing the event queue
+or the statistics:
+
+    session = Session.create(parameters)
+    dash_client = DashClient(session)
+    dash_client.run_application()
+
+Modules created without an explicit session use the active session. The
+DashClient activates its session while creating its modules, so R2A
+implementations don't need to know about sessions.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from base.configuration_parser import ConfigurationParser
+from base.event_log import EventLog
+from base.scheduler import Scheduler
+from base.timer import Timer
+from base.whiteboard import Whiteboard
+
+
+class Session:
+    __default = None
+    __active = threading.local()
+
+    def __init__(self, config_parser, scheduler, timer, whiteboard, event_log=None):
+        self.config_parser = config_parser
+        self.scheduler = scheduler
+        self.timer = timer
+        self.whiteboard = whiteboard
+        self.event_log = event_log if event_log is not None else EventLog(config_parser, timer)
+
+    @staticmethod
+    def get_default():
+        if Session.__default is None:
+            Session.__default = Session(ConfigurationParser.get_instance(), Scheduler(),
+                                        Timer.get_instance(), Whiteboard.get_instance())
+        return Session.__default
+
+    @staticmethod
+    def create(parameters=None):
+        """
+        It returns a new session with its own services. The configuration
+        parameters are read from dash_client.json if they are not given.
+        """
+        config_parser = ConfigurationParser.create(parameters)
+        scheduler = Scheduler.create()
+        timer = Timer.create(config_parser, scheduler)
+        whiteboard = Whiteboard.create()
+        return Session(config_parser, scheduler, timer, whiteboard)
+
+    @staticmethod
+    def get_active():
+        session = getattr(Session.__active, 'session', None)
+        if session is None:
+            return Session.get_default()
+        return session
+
+    @contextmanager
+    def activate(self):
+        previous = getattr(Session.__active, 'session', None)
+        Session.__active.session = self
+        try:
+            yield self
+        finally:
+            Session.__active.session = previous
+
+    def get_config_parser(self):
+        return self.config_parser
+
+    def get_scheduler(self):
+        return self.scheduler
+
+    def get_timer(self):
+        return self.timer
+
+    def get_whiteboard(self):
+        return self.whiteboard
+
+    def get_event_log(self):
+        return self.event_log
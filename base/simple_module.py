@@ -7,29 +7,57 @@
 Abstract Class for Simple Module Implementation.
 
 Class implements basic functionality to be called by the main program.
+
+The handler of each MessageKind is found in a dispatch table built once for
+each module class (when the class is created), so delivering a message is a
+single dict lookup.
 """
 
 from abc import ABCMeta, abstractmethod
-from base.scheduler import Scheduler
+from base.session import Session
 from base.scheduler_event import SchedulerEvent
 from base.message import Message, MessageKind
 
 
 class SimpleModule(metaclass=ABCMeta):
-
-    def __init__(self, id):
-        self.scheduler = Scheduler()
+    # MessageKind -> name of the method that handles it
+    HANDLERS = {
+        MessageKind.XML_REQUEST: 'handle_xml_request',
+        MessageKind.XML_RESPONSE: 'handle_xml_response',
+        MessageKind.SEGMENT_REQUEST: 'handle_segment_size_request',
+        MessageKind.SEGMENT_RESPONSE: 'handle_segment_size_response',
+        MessageKind.SELF: 'handle_self_message',
+    }
+
+    # MessageKind -> handler function of the class
+    dispatch_table = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.dispatch_table = {kind: getattr(cls, name) for kind, name in cls.HANDLERS.items()}
+
+    def __init__(self, id, session=None):
+        # the session services (scheduler, timer, whiteboard and configuration parser)
+        self.session = session if session is not None else Session.get_active()
+        self.scheduler = self.session.scheduler
         self.id = id
 
-    def send_up(self, msg):
-        self.scheduler.add_event(SchedulerEvent(msg, self.id, self.id - 1))
+        # structured log of the module events (see base.event_log)
+        self.event_log = self.session.event_log.get_logger(self.__class__.__name__)
+
+    def send_up(self, msg, delay=0):
+        self.scheduler.add_event(SchedulerEvent(msg, self.id, self.id - 1), delay)
 
         # if self.id == 0:
         #    print(f'Object {self} with id {self.id} is in the top of the control stack!')
         #    exit(0)
 
-    def send_down(self, msg):
-        self.scheduler.add_event(SchedulerEvent(msg, self.id, self.id + 1))
+    def send_down(self, msg, delay=0):
+        self.scheduler.add_event(SchedulerEvent(msg, self.id, self.id + 1), delay)
+
+    def send_self(self, msg, delay=0):
+        # used to schedule the module's own timed events (e.g. under the virtual clock)
+        return self.scheduler.add_event(SchedulerEvent(msg, self.id, self.id), delay)
 
     @abstractmethod
     def initialize(self):
@@ -57,16 +85,12 @@ class SimpleModule(metaclass=ABCMeta):
     def handle_segment_size_response(self, msg):
         pass
 
+    def handle_self_message(self, msg):
+        raise ValueError(f'{self.__class__.__name__} does not handle SELF messages - {msg}')
+
     def handle_message(self, msg):
-        if msg.get_kind() == MessageKind.XML_REQUEST:
-            self.handle_xml_request(msg)
-        elif msg.get_kind() == MessageKind.XML_RESPONSE:
-            self.handle_xml_response(msg)
-        elif msg.get_kind() == MessageKind.SEGMENT_REQUEST:
-            self.handle_segment_size_request(msg)
-        elif msg.get_kind() == MessageKind.SEGMENT_RESPONSE:
-            self.handle_segment_size_response(msg)
-        else:
+        handler = self.dispatch_table.get(msg.kind)
+        if handler is None:
             raise ValueError(f'Invalid Message Kind - {msg}')
 
-        pass
+        handler(self, msg)
@@ -13,3 +13,7 @@ class Singleton(type):
         if cls not in cls._instances:
             cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
+
+    def create(cls, *args, **kwargs):
+        # a new instance that is not shared by the process (see base.session.Session)
+        return super(Singleton, cls).__call__(*args, **kwargs)
@@ -5,9 +5,19 @@
 @description: PyDash Project
 
 A Global timer reference used by all classes.
+
+The timer works with two kinds of clock, selected by the "clock"
+configuration parameter:
+  * real    - the wall clock (time.perf_counter()) since the timer creation;
+  * virtual - the simulation time of the Scheduler. Nothing sleeps in this
+              mode, the time only advances when the Scheduler delivers an
+              event scheduled to the future.
 """
 import time
 
+from base.configuration_parser import ConfigurationParser
+from base.scheduler import Scheduler
+
 
 class Timer():
     __instance = None
@@ -22,11 +32,37 @@ class Timer():
         if Timer.__instance is not None:
             raise Exception('This class is a singleton!')
         else:
-            # for the statistics purpose
-            self.started_time = time.perf_counter()
+            self.setup(ConfigurationParser.get_instance(), Scheduler())
             Timer.__instance = self
 
+    @staticmethod
+    def create(config_parser, scheduler):
+        """
+        It returns a new Timer that is not shared by the process (see base.session.Session).
+        """
+        timer = Timer.__new__(Timer)
+        timer.setup(config_parser, scheduler)
+        return timer
+
+    def setup(self, config_parser, scheduler):
+        clock = str(config_parser.get_parameter('clock', 'real')).lower()
+
+        if clock not in ('real', 'virtual'):
+            raise ValueError(f'Invalid clock parameter - {clock}. It should be real or virtual.')
+
+        self.virtual = bool(clock == 'virtual')
+        self.scheduler = scheduler
+
+        # for the statistics purpose
+        self.started_time = time.perf_counter()
+
+    def is_virtual(self):
+        return self.virtual
+
     def get_current_time(self):
+        if self.virtual:
+            return round(self.scheduler.get_current_time(), 6)
+
         return round(time.perf_counter() - self.started_time, 6)
 
     def get_started_time(self):
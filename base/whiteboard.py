@@ -6,8 +6,73 @@
 
 Whiteboard structure to deliver statistical information
 from the Player to the R2A algorithms.
+
+The getters return read-only views of the Player lists, nothing is copied.
+A view holds the items stored until the moment of the call, so it doesn't
+change while the Player goes on (the lists only grow). The views are taken
+under the Player lock, so they are consistent with the playback thread.
+
+Two statistics are bounded, so a long session takes a constant amount of
+memory: the buffer is the QI of each second of video not played yet (a
+copy, it shrinks as the video is played) and the segment size time at
+buffer keeps only its last buffer_history_size items.
+
+The *_since(cursor) getters return only the items stored after the cursor
+and the cursor to be used in the next call, so an R2A that reads the
+statistics once per segment doesn't read the whole session again:
+
+    qi, self.qi_cursor = self.whiteboard.get_playback_qi_since(self.qi_cursor)
 """
 
+import threading
+from collections import namedtuple
+from collections.abc import Sequence
+
+
+class ReadOnlyView(Sequence):
+    """
+    A read-only view of items[start:stop] of a list.
+    """
+
+    def __init__(self, items, start=0, stop=None):
+        self.__items = items
+        self.__start = start
+        self.__stop = len(items) if stop is None else stop
+
+    def __len__(self):
+        return self.__stop - self.__start
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return ReadOnlyView(self.__items, self.__start + start, self.__start + max(start, stop))
+            return tuple(self.__items[self.__start + i] for i in range(start, stop, step))
+
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('view index out of range')
+        return self.__items[self.__start + key]
+
+    def __iter__(self):
+        for i in range(self.__start, self.__stop):
+            yield self.__items[i]
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+# all the Whiteboard statistics at the same moment
+PlaybackSnapshot = namedtuple('PlaybackSnapshot', ['buffer', 'playback_history', 'playback_qi', 'playback_pauses',
+                                                   'playback_buffer_size', 'playback_segment_size_time_at_buffer',
+                                                   'amount_video_to_play', 'max_buffer_size'])
+
 
 class Whiteboard:
     __instance = None
@@ -23,16 +88,31 @@ class Whiteboard:
             raise Exception('This class is a singleton!')
         else:
             Whiteboard.__instance = self
-            self.__buffer = []
-            self.__playback = []
-            self.__playback_qi = []
-            self.__playback_pauses = []
-            self.__playback_buffer_size = []
-            self.__playback_segment_size_time_at_buffer = []
-            # partial segment size time at buffer list
-            self.__partial_sstb = []
-            self.__max_buffer_size = 0
-            self.__amount_video_to_play = 0
+            self.setup()
+
+    @staticmethod
+    def create():
+        """
+        It returns a new Whiteboard that is not shared by the process (see base.session.Session).
+        """
+        whiteboard = Whiteboard.__new__(Whiteboard)
+        whiteboard.setup()
+        return whiteboard
+
+    def setup(self):
+        self.__buffer = []
+        self.__playback = []
+        self.__playback_qi = []
+        self.__playback_pauses = []
+        self.__playback_buffer_size = []
+        self.__playback_segment_size_time_at_buffer = []
+        self.__max_buffer_size = 0
+        self.__amount_video_to_play = 0
+        # the Player lock, held by the Player while it changes the lists
+        self.__lock = threading.RLock()
+
+    def add_lock(self, lock):
+        self.__lock = lock
 
     def add_buffer(self, buffer):
         self.__buffer = buffer
@@ -60,26 +140,41 @@ class Whiteboard:
 
     def get_playback_segment_size_time_at_buffer(self):
         """
-        It returns a list of the time each segment size spends
-        in the buffer before was played by the player. The list
-        will increase over time. It is ordered from the oldest
-        segment until de newest one (from the begging until the
-        end of the reproduced video).
+        It returns a list of the time the video of each playback
+        step spent in the buffer before was played by the player.
+        Only the last buffer_history_size items are kept. It is
+        ordered from the oldest step until the newest one.
         """
-        pos = 0
+        with self.__lock:
+            return self.__window(self.__playback_segment_size_time_at_buffer)
 
-        try:
-            pos = [x[1] for x in self.__playback_segment_size_time_at_buffer].index(-1, max(len(self.__partial_sstb) - 1, 0))
-        except:
-            pos = len(self.__playback_segment_size_time_at_buffer)
+    def get_playback_segment_size_time_at_buffer_since(self, cursor=0):
+        # the items dropped from the history since the cursor are skipped
+        with self.__lock:
+            return self.__since(self.__playback_segment_size_time_at_buffer,
+                                max(cursor, self.__get_first_index(self.__playback_segment_size_time_at_buffer)))
 
-        plist = [round(x[1] - x[0], 6) for x in self.__playback_segment_size_time_at_buffer[len(self.__partial_sstb):pos]]
-        self.__partial_sstb = self.__partial_sstb + plist
+    # it returns a view of the items kept by a (windowed) history
+    def __window(self, items):
+        return ReadOnlyView(items, self.__get_first_index(items))
 
-        return tuple(self.__partial_sstb)
+    @staticmethod
+    def __get_first_index(items):
+        return items.get_first_index() if hasattr(items, 'get_first_index') else 0
+
+    # it returns a tuple (view of the items after cursor, cursor to the next call)
+    def __since(self, items, cursor):
+        length = len(items)
+        return ReadOnlyView(items, min(cursor, length), length), length
 
     def get_buffer(self):
-        return tuple(self.__buffer)
+        """
+        It returns a tuple of the QI of each second of video in the buffer (not played
+        yet), from the next one to be played. The QIs already played are given by
+        get_playback_qi().
+        """
+        with self.__lock:
+            return tuple(self.__buffer)
 
     def get_amount_video_to_play(self):
         """
@@ -95,10 +190,16 @@ class Whiteboard:
 
     def get_playback_qi(self):
         """
-        It returns a tuples list of time and QI's segments already played by the Player.
-        The time represents the moment when a QI segment was consumed (played) by the Player.
+        It returns a tuples list of time and QI's segments already played by the Player, one
+        per playback step. The time represents the moment when the step was played; a step
+        that plays two segments has the QI of the one that filled most of it.
         """
-        return tuple(self.__playback_qi)
+        with self.__lock:
+            return ReadOnlyView(self.__playback_qi)
+
+    def get_playback_qi_since(self, cursor=0):
+        with self.__lock:
+            return self.__since(self.__playback_qi, cursor)
 
     def get_playback_pauses(self):
         """
@@ -107,7 +208,12 @@ class Whiteboard:
         the pauses represents the lenght of this pauses.
         """
 
-        return tuple(self.__playback_pauses)
+        with self.__lock:
+            return ReadOnlyView(self.__playback_pauses)
+
+    def get_playback_pauses_since(self, cursor=0):
+        with self.__lock:
+            return self.__since(self.__playback_pauses, cursor)
 
     def get_playback_buffer_size(self):
         """
@@ -115,7 +221,12 @@ class Whiteboard:
         The time represents the moment when the __buffer size was measured.
         """
 
-        return tuple(self.__playback_buffer_size)
+        with self.__lock:
+            return ReadOnlyView(self.__playback_buffer_size)
+
+    def get_playback_buffer_size_since(self, cursor=0):
+        with self.__lock:
+            return self.__since(self.__playback_buffer_size, cursor)
 
     def get_playback_history(self):
         """
@@ -124,4 +235,20 @@ class Whiteboard:
         to play or not the video. For __playback, the number one means it was possible to
         play and zero is otherwise.
         """
-        return tuple(self.__playback)
+        with self.__lock:
+            return ReadOnlyView(self.__playback)
+
+    def get_playback_history_since(self, cursor=0):
+        with self.__lock:
+            return self.__since(self.__playback, cursor)
+
+    def get_playback_snapshot(self):
+        """
+        It returns a PlaybackSnapshot with all the statistics taken at the same moment.
+        """
+        with self.__lock:
+            return PlaybackSnapshot(tuple(self.__buffer), ReadOnlyView(self.__playback),
+                                    ReadOnlyView(self.__playback_qi), ReadOnlyView(self.__playback_pauses),
+                                    ReadOnlyView(self.__playback_buffer_size),
+                                    self.__window(self.__playback_segment_size_time_at_buffer),
+                                    self.__amount_video_to_play, self.__max_buffer_size)
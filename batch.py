@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+Batch runner: it runs many sessions in parallel over a process pool.
+
+The batch file (batch.json by default) defines a base configuration and a
+matrix of parameters. One session is run for each combination of the matrix
+values, e.g.:
+
+    {
+        "base_config": "dash_client.json",
+        "results_dir": "./results/batch",
+        "workers": 4,
+        "matrix": {
+            "r2a_algorithm": ["R2AFixed", "r2aPandas"],
+            "traffic_shaping_profile_sequence": ["LMH", "HML"],
+            "seed": [1, 2],
+            "max_buffer_size": [30, 60]
+        }
+    }
+
+The "seed" parameter sets the traffic shaping seed and the Python random
+seed of the session. Each session has its own results directory with its
+configuration, output, plots and a summary.json file. The summary of all
+sessions and the average values for each R2A algorithm are stored in the
+batch results directory.
+
+Usage: python3 batch.py [batch.json] [--workers N] [--results-dir DIR]
+"""
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+
+
+def build_runs(base_config, matrix, results_dir):
+    keys = list(matrix.keys())
+    runs = []
+
+    for run_id, values in enumerate(itertools.product(*[matrix[key] for key in keys]), start=1):
+        parameters = dict(zip(keys, values))
+        config = dict(base_config)
+        config.update(parameters)
+
+        if 'seed' in parameters:
+            config['traffic_shaping_seed'] = str(parameters['seed'])
+
+        name = f'run_{run_id:04d}_' + '_'.join(str(v) for v in values)
+        config['results_dir'] = os.path.join(results_dir, name)
+        runs.append((name, parameters, config))
+
+    return runs
+
+
+def run_session(name, config):
+    """
+    It runs a single session in a worker process. The session has its own
+    services (ConfigurationParser, Timer, Whiteboard, Scheduler and EventLog),
+    so the sessions run by the same worker don't share any state.
+    """
+    results_dir = config['results_dir']
+    os.makedirs(results_dir, exist_ok=True)
+
+    with open(os.path.join(results_dir, 'config.json'), 'w') as f:
+        json.dump(config, f, indent=4)
+
+    summary = {'run': name}
+
+    with open(os.path.join(results_dir, 'output.txt'), 'w') as output, contextlib.redirect_stdout(output):
+        try:
+            from base.session import Session
+            from dash_client import DashClient
+
+            random.seed(config.get('seed'))
+            dash_client = DashClient(Session.create(config))
+            dash_client.run_application()
+
+            summary.update(dash_client.player.get_session_summary())
+        except SystemExit as err:
+            # exit() is called by the modules when something goes wrong
+            summary['error'] = f'exit({err.code})'
+        except Exception as err:
+            summary['error'] = repr(err)
+
+    with open(os.path.join(results_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=4)
+
+    return summary
+
+
+# Pool.imap_unordered() calls a function of one argument
+def run_session_item(item):
+    return run_session(*item)
+
+
+def aggregate(summaries, matrix_keys, group_by='r2a_algorithm'):
+    groups = {}
+    for summary in summaries:
+        if 'error' not in summary:
+            groups.setdefault(summary.get(group_by), []).append(summary)
+
+    aggregated = {}
+    for group, items in groups.items():
+        aggregated[str(group)] = {'runs': len(items)}
+        for key, value in items[0].items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and key not in matrix_keys:
+                aggregated[str(group)][key] = sum(item[key] for item in items) / len(items)
+
+    return aggregated
+
+
+def write_summaries(results_dir, summaries, aggregated):
+    with open(os.path.join(results_dir, 'summary.json'), 'w') as f:
+        json.dump({'runs': summaries, 'aggregated': aggregated}, f, indent=4)
+
+    fields = []
+    for summary in summaries:
+        fields += [key for key in summary if key not in fields]
+
+    with open(os.path.join(results_dir, 'summary.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Runs a matrix of pyDash sessions in parallel.')
+    arg_parser.add_argument('batch_file', nargs='?', default='batch.json')
+    arg_parser.add_argument('--workers', type=int, default=None)
+    arg_parser.add_argument('--results-dir', default=None)
+    args = arg_parser.parse_args()
+
+    with open(args.batch_file) as f:
+        batch = json.load(f)
+
+    with open(batch.get('base_config', 'dash_client.json')) as f:
+        base_config = json.load(f)
+    base_config.update(batch.get('base', {}))
+
+    results_dir = args.results_dir or batch.get('results_dir', './results/batch')
+    workers = args.workers or batch.get('workers') or os.cpu_count()
+    os.makedirs(results_dir, exist_ok=True)
+
+    runs = build_runs(base_config, batch.get('matrix', {}), results_dir)
+    print(f'Running {len(runs)} sessions with {workers} workers.')
+
+    summaries = []
+
+    parameters_by_name = {name: parameters for name, parameters, config in runs}
+
+    # the workers are reused, each session is isolated by its own Session. Leaving the
+    # with block terminates the workers, so Ctrl-C stops the running sessions too
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        try:
+            sessions = pool.imap_unordered(run_session_item, [(name, config) for name, parameters, config in runs])
+            for done, summary in enumerate(sessions, start=1):
+                name = summary['run']
+                summary.update(parameters_by_name[name])
+                summaries.append(summary)
+
+                status = summary['error'] if 'error' in summary else f'pauses: {summary["pauses_number"]}, average qi: {summary["average_qi"]:.2f}'
+                print(f'[{done}/{len(runs)}] {name} > {status}')
+        except KeyboardInterrupt:
+            print(f'Batch interrupted, {len(summaries)} of {len(runs)} sessions finished.')
+            sys.exit(130)
+
+    summaries.sort(key=lambda summary: summary['run'])
+    aggregated = aggregate(summaries, batch.get('matrix', {}).keys())
+    write_summaries(results_dir, summaries, aggregated)
+
+    print('Average values by R2A algorithm:')
+    for group, values in aggregated.items():
+        print(f'> {group}: ' + ', '.join(f'{key}: {value:.2f}' for key, value in values.items()))
+
+    failed = [summary['run'] for summary in summaries if 'error' in summary]
+    if failed:
+        print(f'{len(failed)} sessions failed: {", ".join(failed)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+Benchmark suite: micro benchmarks of the hot paths of the client and an
+end-to-end session against the local origin server (origin.origin_server).
+
+    scheduler   Scheduler.add_event() and get_event() with n pending events
+    parser      parse_mpd() (cold and cached) and navigate_mpd() on a small
+                MPD and on a large multi-period MPD with SegmentTimelines
+    whiteboard  the Whiteboard getters as the playback history grows
+    message     SSMessage.get_url() (SegmentTemplate, timeline and legacy)
+    r2a         the decision latency (handle_segment_size_request()) of
+                R2AFixed, R2ARandom, R2A_AverageThroughput and r2aPandas
+    session     a whole headless session (virtual clock) against the local
+                origin, sequential and pipelined; it fails if any segment
+                is not downloaded or not played
+    startup     the import time and the wall time of a short session in a
+                new Python process, headless and plotting the statistics
+
+The results are written as JSON (results/benchmark.json by default) with
+the git commit, the Python version and the platform, so the results of two
+commits can be compared:
+
+    python3 benchmark.py --output before.json
+    ... change the code ...
+    python3 benchmark.py --compare before.json
+
+Usage: python3 benchmark.py [scheduler parser ...] [--quick] [--repeat N]
+       [--output FILE] [--compare FILE] [--tolerance 0.1]
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT_DIR)
+
+from base.message import Message, MessageKind, SSMessage
+from base.scheduler import Scheduler
+from base.scheduler_event import SchedulerEvent
+from base.session import Session
+from base.whiteboard import Whiteboard
+from origin.origin_server import DEFAULT_LADDER, OriginServer, build_mpd
+from player.out_vector import OutVector
+from player.parser import navigate_mpd, parse_mpd, parse_mpd_content
+from player.segment_template import SegmentURLBuilder
+
+R2A_ALGORITHMS = ['R2AFixed', 'R2ARandom', 'R2A_AverageThroughput', 'r2aPandas']
+
+MPD_URL = 'http://127.0.0.1:8080/synthetic/synthetic.mpd'
+
+
+def build_large_mpd(periods, segments, ladder=DEFAULT_LADDER):
+    """
+    It returns a multi-period MPD, each period with a video adaptation set (a representation
+    for each bitrate of the ladder and a SegmentTimeline of 'segments' S elements) and an
+    audio adaptation set.
+    """
+    timeline = ''.join(f'<S d="{2000 + i % 7}"/>' for i in range(segments))
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S">',
+             '<ProgramInformation><Title>large</Title></ProgramInformation>']
+
+    for period in range(periods):
+        lines.append(f'<Period id="{period}">')
+        lines.append('<AdaptationSet mimeType="video/mp4" contentType="video">')
+        lines.append(f'<SegmentTemplate timescale="1000" media="$RepresentationID$/$Time$.m4s" '
+                     f'initialization="$RepresentationID$/init.mp4"><SegmentTimeline>{timeline}</SegmentTimeline>'
+                     f'</SegmentTemplate>')
+        lines += [f'<Representation id="p{period}_{bandwidth}" bandwidth="{bandwidth}" width="480" height="360"/>'
+                  for bandwidth in ladder]
+        lines.append('</AdaptationSet>')
+        lines.append('<AdaptationSet mimeType="audio/mp4" contentType="audio">')
+        lines.append(f'<Representation id="p{period}_audio" bandwidth="128000"/>')
+        lines.append('</AdaptationSet>')
+        lines.append('</Period>')
+
+    lines.append('</MPD>')
+    return '\n'.join(lines)
+
+
+def per_operation(samples, number):
+    """
+    It returns the timing of one operation from the samples (s) of 'number' operations.
+    """
+    samples = [sample / number for sample in samples]
+    return {'unit': 's', 'best': min(samples), 'median': statistics.median(samples),
+            'ops_per_s': 1 / min(samples) if min(samples) > 0 else None}
+
+
+def time_function(function, number, repeat):
+    return per_operation(timeit.Timer(function).repeat(repeat, number), number)
+
+
+def latencies(samples):
+    """
+    It returns the distribution of the latency samples (ns) of single operations.
+    """
+    samples = sorted(samples)
+    quantile = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)] / 1e9
+    return {'unit': 's', 'best': samples[0] / 1e9, 'median': quantile(0.5), 'p90': quantile(0.9),
+            'p99': quantile(0.99), 'max': samples[-1] / 1e9, 'mean': statistics.mean(samples) / 1e9,
+            'samples': len(samples)}
+
+
+def bench_scheduler(options):
+    results = {}
+    sizes = [1000, 10000] if options.quick else [1000, 10000, 100000]
+    rng = random.Random(1)
+
+    for n in sizes:
+        add_samples, get_samples = [], []
+        for _ in range(options.repeat):
+            scheduler = Scheduler.create()
+            events = [SchedulerEvent(None, 0, 0) for _ in range(n)]
+            delays = [rng.random() for _ in range(n)]
+
+            started_time = time.perf_counter()
+            for event, delay in zip(events, delays):
+                scheduler.add_event(event, delay)
+            add_samples.append(time.perf_counter() - started_time)
+
+            started_time = time.perf_counter()
+            while not scheduler.is_empty():
+                scheduler.get_event()
+            get_samples.append(time.perf_counter() - started_time)
+
+        results[f'scheduler.add_event[n={n}]'] = per_operation(add_samples, n)
+        results[f'scheduler.get_event[n={n}]'] = per_operation(get_samples, n)
+
+    return results
+
+
+def bench_parser(options):
+    results = {}
+    number = 10 if options.quick else 50
+    mpds = {
+        'small': build_mpd(DEFAULT_LADDER, 1, 600),
+        'large': build_large_mpd(10 if options.quick else 50, 200 if options.quick else 1000),
+    }
+
+    for name, content in mpds.items():
+        def parse_cold():
+            parse_mpd_content(content).build_indexes()
+
+        parse_number = max(1, number // 10) if name == 'large' else number
+        results[f'parser.parse_mpd[{name},cold]'] = time_function(parse_cold, parse_number, options.repeat)
+
+        node = parse_mpd(content)
+        results[f'parser.parse_mpd[{name},cached]'] = time_function(lambda: parse_mpd(content), number * 100,
+                                                                    options.repeat)
+
+        representation_id = node.get_adaptation_set_info()[-1]['id']
+        results[f'parser.navigate_mpd[{name},attribute]'] = time_function(
+            lambda: navigate_mpd(node, 'timescale'), number * 1000, options.repeat)
+        results[f'parser.navigate_mpd[{name},representation]'] = time_function(
+            lambda: navigate_mpd(node, representation_id=representation_id), number * 1000, options.repeat)
+
+    return results
+
+
+def bench_whiteboard(options):
+    results = {}
+    sizes = [100, 10000] if options.quick else [100, 10000, 1000000]
+    number = 10000
+
+    for n in sizes:
+        whiteboard = Whiteboard.create()
+        playback, playback_qi, buffer_size = OutVector('q'), OutVector('q'), OutVector()
+        for i in range(n):
+            playback.add(i, 1)
+            playback_qi.add(i, i % 20)
+            buffer_size.add(i, i % 60)
+        whiteboard.add_playback_history(playback)
+        whiteboard.add_playback_qi(playback_qi)
+        whiteboard.add_playback_buffer_size(buffer_size)
+
+        getters = {
+            'get_playback_history': whiteboard.get_playback_history,
+            'get_playback_qi': whiteboard.get_playback_qi,
+            'get_playback_buffer_size[-1]': lambda: whiteboard.get_playback_buffer_size()[-1],
+            'get_playback_qi_since': lambda: whiteboard.get_playback_qi_since(n - 1),
+            'get_playback_snapshot': whiteboard.get_playback_snapshot,
+        }
+        for name, getter in getters.items():
+            results[f'whiteboard.{name}[n={n}]'] = time_function(getter, number, options.repeat)
+
+    return results
+
+
+def bench_message(options):
+    results = {}
+    number = 10000 if options.quick else 100000
+
+    small = parse_mpd(build_mpd(DEFAULT_LADDER, 1, 600))
+    large = parse_mpd(build_large_mpd(2, 1000))
+
+    for name, parsed_mpd in (('template', small), ('timeline', large)):
+        msg = SSMessage(MessageKind.SEGMENT_REQUEST)
+        msg.add_url_builder(SegmentURLBuilder(parsed_mpd, MPD_URL))
+        msg.add_quality_id(parsed_mpd.get_qi()[10])
+        msg.add_segment_id(500)
+        results[f'message.get_url[{name}]'] = time_function(msg.get_url, number, options.repeat)
+
+    msg = SSMessage(MessageKind.SEGMENT_REQUEST)
+    msg.add_path_name('http://127.0.0.1:8080/synthetic')
+    msg.add_media_mpd('$Bandwidth$bps/segment_$Number$.m4s')
+    msg.add_quality_id(small.get_qi()[10])
+    msg.add_segment_id(500)
+    results['message.get_url[legacy]'] = time_function(msg.get_url, number, options.repeat)
+
+    return results
+
+
+def bench_r2a(options):
+    results = {}
+    decisions = 1000 if options.quick else 10000
+    content = build_mpd(DEFAULT_LADDER, 1, decisions)
+    parsed_mpd = parse_mpd(content)
+
+    for algorithm in R2A_ALGORITHMS:
+        random.seed(1)
+        rng = random.Random(1)
+        session = Session.create({'clock': 'virtual'})
+        scheduler = session.scheduler
+
+        # the events sent by the R2A are taken from the scheduler, the time advances by 'delay'
+        def drain(delay=0):
+            if delay > 0:
+                scheduler.add_event(SchedulerEvent(None, 1, 1), delay)
+            while not scheduler.is_empty():
+                scheduler.get_event()
+
+        # the R2A algorithms print their choices
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), session.activate():
+            module = __import__('r2a.' + algorithm.lower(), fromlist=[algorithm])
+            r2a = getattr(module, algorithm)(1)
+            r2a.initialize()
+
+            r2a.handle_xml_request(Message(MessageKind.XML_REQUEST, MPD_URL))
+            drain(0.01)
+            msg = Message(MessageKind.XML_RESPONSE, content)
+            msg.add_bit_length(8 * len(content))
+            msg.add_parsed_mpd(parsed_mpd)
+            r2a.handle_xml_response(msg)
+            drain()
+
+            samples = []
+            for segment_id in range(1, decisions + 1):
+                msg = SSMessage(MessageKind.SEGMENT_REQUEST)
+                msg.add_segment_id(segment_id)
+
+                started_time = time.perf_counter_ns()
+                r2a.handle_segment_size_request(msg)
+                samples.append(time.perf_counter_ns() - started_time)
+
+                # the segment is downloaded at 0.5 to 5 Mbps
+                drain(msg.get_quality_id() / rng.uniform(0.5e6, 5e6))
+                msg.set_kind(MessageKind.SEGMENT_RESPONSE)
+                msg.add_bit_length(msg.get_quality_id())
+                r2a.handle_segment_size_response(msg)
+                drain()
+
+            r2a.finalization()
+
+        results[f'r2a.decision[{algorithm}]'] = latencies(samples)
+
+    return results
+
+
+def bench_session(options):
+    from dash_client import DashClient
+
+    results = {}
+    segment_count = 30 if options.quick else 120
+
+    with open(os.path.join(ROOT_DIR, 'dash_client.json')) as f:
+        base_config = json.load(f)
+
+    # (R2A algorithm, connection backend, max outstanding requests)
+    sessions = [('R2AFixed', 'sync', 1), ('r2aPandas', 'sync', 1), ('r2aPandas', 'asyncio', 3)]
+
+    origin = OriginServer(port=0, segment_count=segment_count).start()
+    try:
+        for algorithm, backend, outstanding_requests in sessions:
+            samples = []
+            for _ in range(1 if options.quick else options.repeat):
+                with tempfile.TemporaryDirectory() as results_dir:
+                    config = dict(base_config, url_mpd=origin.get_mpd_url(), clock='virtual', headless=True,
+                                  r2a_algorithm=algorithm, connection_backend=backend,
+                                  max_outstanding_requests=outstanding_requests, results_dir=results_dir,
+                                  segment_cache=False, http_trace_mode='off')
+                    random.seed(1)
+
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        started_time = time.perf_counter()
+                        dash_client = DashClient(Session.create(config))
+                        dash_client.run_application()
+                        samples.append(time.perf_counter() - started_time)
+
+                    # a regression check: every segment must be downloaded and played
+                    summary = dash_client.player.get_session_summary()
+                    if summary['segments_downloaded'] != segment_count or summary['played_time'] != segment_count:
+                        raise RuntimeError(f'The {algorithm} session ({backend}, {outstanding_requests} outstanding '
+                                           f'requests) played {summary["played_time"]}s and downloaded '
+                                           f'{summary["segments_downloaded"]} of {segment_count} segments.')
+
+            result = per_operation(samples, 1)
+            result['segments'] = segment_count
+            result['segments_per_s'] = segment_count / result['median']
+            result.update(summary)
+            name = algorithm if backend == 'sync' else f'{algorithm},{backend}x{outstanding_requests}'
+            results[f'session[{name},virtual,{segment_count}x1s]'] = result
+    finally:
+        origin.stop()
+
+    return results
+
+
+# it runs a session in a new process and prints the import and session times (the last line)
+STARTUP_SCRIPT = '''
+import json, sys, time
+started_time = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from base.session import Session
+from dash_client import DashClient
+import_time = time.perf_counter() - started_time
+dash_client = DashClient(Session.create(json.loads(sys.argv[2])))
+dash_client.run_application()
+print(json.dumps({'import_time': import_time, 'session_time': time.perf_counter() - started_time}))
+'''
+
+
+def bench_startup(options):
+    results = {}
+    segment_count = 5
+    repeat = 1 if options.quick else options.repeat
+
+    with open(os.path.join(ROOT_DIR, 'dash_client.json')) as f:
+        base_config = json.load(f)
+
+    origin = OriginServer(port=0, segment_count=segment_count).start()
+    try:
+        for headless in (True, False):
+            import_samples, session_samples, process_samples = [], [], []
+            for _ in range(repeat):
+                with tempfile.TemporaryDirectory() as results_dir:
+                    config = dict(base_config, url_mpd=origin.get_mpd_url(), clock='virtual', headless=headless,
+                                  results_dir=results_dir, segment_cache=False, http_trace_mode='off',
+                                  log_console_level='off')
+
+                    started_time = time.perf_counter()
+                    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, ROOT_DIR, json.dumps(config)],
+                                            cwd=results_dir, capture_output=True, text=True, check=True).stdout
+                    process_samples.append(time.perf_counter() - started_time)
+
+                times = json.loads(output.splitlines()[-1])
+                import_samples.append(times['import_time'])
+                session_samples.append(times['session_time'])
+
+            mode = 'headless' if headless else 'plots'
+            results[f'startup.import[{mode}]'] = per_operation(import_samples, 1)
+            results[f'startup.session[{mode},{segment_count}x1s]'] = per_operation(session_samples, 1)
+            results[f'startup.process[{mode},{segment_count}x1s]'] = per_operation(process_samples, 1)
+    finally:
+        origin.stop()
+
+    return results
+
+
+BENCHMARKS = {
+    'scheduler': bench_scheduler,
+    'parser': bench_parser,
+    'whiteboard': bench_whiteboard,
+    'message': bench_message,
+    'r2a': bench_r2a,
+    'session': bench_session,
+    'startup': bench_startup,
+}
+
+
+def get_metadata():
+    metadata = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'commit': None,
+    }
+    try:
+        metadata['commit'] = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return metadata
+
+
+def compare(results, previous, tolerance):
+    """
+    It prints the ratio (current / previous) of the best time of the benchmarks found in
+    both results (the best time is the least affected by the noise of the machine). It
+    returns the names of the benchmarks slower than 1 + tolerance.
+    """
+    slower = []
+    print(f'Comparing with commit {previous["metadata"].get("commit")}:')
+
+    for name, result in results['benchmarks'].items():
+        old = previous['benchmarks'].get(name)
+        if old is None or not old.get('best'):
+            continue
+
+        ratio = result['best'] / old['best']
+        status = ''
+        if ratio > 1 + tolerance:
+            status = ' slower'
+            slower.append(name)
+        elif ratio < 1 - tolerance:
+            status = ' faster'
+        print(f'> {name}: {old["best"]:.3g}s -> {result["best"]:.3g}s ({ratio:.2f}x){status}')
+
+    return slower
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Runs the pyDash benchmarks.')
+    arg_parser.add_argument('benchmarks', nargs='*', help=f'benchmarks to run: {", ".join(BENCHMARKS)} (all of them by default)')
+    arg_parser.add_argument('--quick', action='store_true', help='smaller sizes, for a fast check')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--output', default=os.path.join('results', 'benchmark.json'))
+    arg_parser.add_argument('--compare', default=None, help='results of a previous run')
+    arg_parser.add_argument('--tolerance', type=float, default=0.1)
+    args = arg_parser.parse_args()
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            arg_parser.error(f'invalid benchmark - {name}. It should be one of {", ".join(BENCHMARKS)}.')
+
+    results = {'metadata': get_metadata(), 'benchmarks': {}}
+    results['metadata']['options'] = {'quick': args.quick, 'repeat': args.repeat}
+
+    for name in args.benchmarks or list(BENCHMARKS):
+        print(f'Running {name} benchmarks...')
+        for key, result in BENCHMARKS[name](args).items():
+            results['benchmarks'][key] = result
+            print(f'> {key}: {result["median"]:.3g}s')
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        if slower:
+            print(f'{len(slower)} benchmarks are slower: {", ".join(slower)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+An asyncio implementation of the ConnectionHandler that keeps many segment
+requests outstanding (HTTP request pipelining over parallel connections).
+
+The segment requests are sent as soon as they arrive from the R2A, each one
+with the quality chosen for it, and downloaded concurrently by an asyncio
+event loop running in a background thread (up to max_outstanding_requests
+at the same time). The responses are delivered back into the Scheduler in
+the segment order: for each request the handler schedules a SELF event that
+waits for the oldest outstanding download and sends its response up.
+
+The MPD file, the segment cache, the record/replay and the traffic shaping
+work as in the ConnectionHandler. Using the token bucket the concurrent
+downloads share the bucket, as they share the bottleneck link. Using the
+virtual clock the emulated downloads share the link, so a segment transfer
+starts only when the previous one has finished.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from base.event_log import DEBUG
+from base.message import Message, MessageKind
+from connection.connection_handler import ConnectionHandler
+
+
+class AsyncConnectionHandler(ConnectionHandler):
+
+    def __init__(self, id, session=None):
+        ConnectionHandler.__init__(self, id, session)
+
+        config_parser = self.session.config_parser
+        self.max_outstanding_requests = int(config_parser.get_parameter('max_outstanding_requests', 1))
+        self.keep_alive = bool(config_parser.get_parameter('http_keep_alive', True))
+
+        # (msg, future, downloaded, request time) of the segments being downloaded, in the segment order
+        self.outstanding_requests = deque()
+
+        # (host, port) -> list of (reader, writer) of idle connections
+        self.idle_streams = {}
+
+        self.semaphore = asyncio.Semaphore(self.max_outstanding_requests)
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+
+    def finalization(self):
+        ConnectionHandler.finalization(self)
+
+        asyncio.run_coroutine_threadsafe(self.close_streams(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+
+    def submit_segment_request(self, host_name, path_name):
+        """
+        It returns a tuple (future, downloaded). The concurrent.futures.Future result is
+        a tuple (status, size in bytes, chunk arrivals, content, exchange time), the content
+        is kept only if the segment cache stores contents. downloaded is False if the
+        segment came from the segment cache or from the HTTP trace (replay).
+        """
+        future = Future()
+
+        if self.segment_cache is not None:
+            size = self.segment_cache.get_size(path_name)
+            if size is not None:
+                return asyncio.run_coroutine_threadsafe(self.pace_transfer_result((200, size, [], None, 0)),
+                                                        self.loop), False
+
+        if self.http_trace_replayer is not None:
+            try:
+                status, content, size = self.http_get(host_name, path_name)
+            except Exception as err:
+                future.set_exception(err)
+                return future, False
+            return asyncio.run_coroutine_threadsafe(
+                self.pace_transfer_result((status, size, [], None, self.exchange_time)), self.loop), False
+
+        host, port = self.split_host_name(host_name)
+        keep_content = self.segment_cache is not None and self.segment_cache.store_content
+        return asyncio.run_coroutine_threadsafe(self.fetch(host, port, path_name, keep_content), self.loop), True
+
+    async def pace(self, chunk_size):
+        # the asyncio version of TokenBucket.consume, the other downloads go on while it waits
+        if self.token_bucket is None or self.timer.is_virtual():
+            return
+
+        waiting_time = self.token_bucket.reserve(8 * chunk_size)
+        while waiting_time > 0:
+            await asyncio.sleep(waiting_time)
+            waiting_time = min(self.token_bucket.get_waiting_time(), self.token_bucket.max_sleep)
+
+    async def pace_transfer_result(self, result):
+        # the segments that don't come through a socket (cached or replayed) are paced as a whole
+        status, size = result[:2]
+        if status == 200:
+            await self.pace(size)
+        return result
+
+    async def open_stream(self, host, port):
+        idle = self.idle_streams.get((host, port))
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+
+        reader, writer = await asyncio.open_connection(host, port)
+        return reader, writer, False
+
+    async def send_request(self, host, port, path_name):
+        reader, writer, reused = await self.open_stream(host, port)
+        request = f'GET {path_name} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+        if not self.keep_alive:
+            request += 'Connection: close\r\n'
+        writer.write((request + '\r\n').encode())
+
+        try:
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError('Connection closed by the server')
+        except (ConnectionResetError, BrokenPipeError):
+            writer.close()
+            if not reused:
+                raise
+            # the server has closed the idle connection, reconnecting
+            return await self.send_request(host, port, path_name)
+
+        return reader, writer, status_line
+
+    async def fetch(self, host, port, path_name, keep_content=False):
+        async with self.semaphore:
+            started_time = time.perf_counter()
+            reader, writer, status_line = await self.send_request(host, port, path_name)
+
+            status = int(status_line.split()[1])
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip()
+
+            content = bytearray() if keep_content else None
+            size = 0
+            chunk_arrivals = []
+
+            if headers.get('transfer-encoding', '').lower() == 'chunked':
+                while True:
+                    chunk_size = int((await reader.readline()).split(b';')[0], 16)
+                    if chunk_size == 0:
+                        await reader.readline()
+                        break
+                    data = await reader.readexactly(chunk_size)
+                    size += len(data)
+                    await self.pace(len(data))
+                    chunk_arrivals.append((time.perf_counter() - started_time, len(data)))
+                    if keep_content:
+                        content += data
+                    await reader.readline()
+            elif 'content-length' in headers:
+                remaining = int(headers['content-length'])
+                while remaining > 0:
+                    data = await reader.read(min(remaining, len(self.read_buffer)))
+                    if not data:
+                        raise ConnectionResetError('Connection closed by the server')
+                    remaining -= len(data)
+                    size += len(data)
+                    await self.pace(len(data))
+                    chunk_arrivals.append((time.perf_counter() - started_time, len(data)))
+                    if keep_content:
+                        content += data
+            else:
+                # the response ends when the server closes the connection
+                headers['connection'] = 'close'
+                while True:
+                    data = await reader.read(len(self.read_buffer))
+                    if not data:
+                        break
+                    size += len(data)
+                    await self.pace(len(data))
+                    chunk_arrivals.append((time.perf_counter() - started_time, len(data)))
+                    if keep_content:
+                        content += data
+
+            if self.keep_alive and headers.get('connection', '').lower() != 'close':
+                self.idle_streams.setdefault((host, port), []).append((reader, writer))
+            else:
+                writer.close()
+
+            elapsed_time = time.perf_counter() - started_time
+            return status, size, chunk_arrivals, bytes(content) if keep_content else None, elapsed_time
+
+    async def close_streams(self):
+        for idle in self.idle_streams.values():
+            for reader, writer in idle:
+                writer.close()
+        self.idle_streams = {}
+
+    def handle_segment_size_request(self, msg):
+        if self.event_log.is_enabled(DEBUG):
+            self.event_log.debug('selected_qi', 'Execution Time {time} > selected QI: {qi}',
+                                 qi=self.parsed_mpd.get_qi_index(msg.get_quality_id()), segment_id=msg.get_segment_id())
+
+        path_name = self.get_segment_url(msg)
+        if path_name is None:
+            future, downloaded = Future(), False
+            future.set_result((404, 0, [], None, 0))
+        else:
+            future, downloaded = self.submit_segment_request(msg.get_host_name(), path_name)
+        self.outstanding_requests.append((msg, path_name, future, downloaded, time.perf_counter()))
+
+        # the responses are delivered in the order the requests were made
+        self.send_self(Message(MessageKind.SELF, 'deliver'))
+
+    def handle_self_message(self, msg):
+        msg, path_name, future, downloaded, self.initial_time = self.outstanding_requests.popleft()
+
+        try:
+            status, size, chunk_arrivals, content, self.exchange_time = future.result()
+        except Exception as err:
+            self.event_log.error('connection_error', '> Houston, we have a problem!\n> trying to connecto to: {url}\n{error}',
+                                 url=path_name, error=err)
+            exit(-1)
+
+        found = bool(status == 200)
+
+        if downloaded:
+            if self.http_trace_recorder is not None:
+                self.http_trace_recorder.record(path_name, status, size, self.exchange_time)
+
+            if found and self.segment_cache is not None:
+                if content is not None:
+                    self.segment_cache.put(path_name, content)
+                else:
+                    self.segment_cache.put_size(path_name, size)
+
+        msg.set_kind(MessageKind.SEGMENT_RESPONSE)
+
+        delay = 0
+
+        if found and size > 0:
+            msg.add_bit_length(8 * size)
+        else:
+            msg.set_found(False)
+
+        if self.timer.is_virtual():
+            delay, chunk_arrivals = self.emulate_link_transfer(msg, size, chunk_arrivals)
+        elif msg.found():
+            delay = self.bandwidth_limitation(msg.get_bit_length())
+
+        if msg.found():
+            msg.add_chunk_arrivals(chunk_arrivals)
+
+        self.send_up(msg, delay)
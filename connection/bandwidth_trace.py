@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+A bandwidth trace used by the ConnectionHandler traffic shaping instead of
+the L/M/H profiles.
+
+The trace is a text file with two columns: timestamp (seconds) and bandwidth
+(multiplied by scale, it should give bits per second), separated by spaces,
+tabs or commas. Lines starting with # are ignored. The bandwidth of a
+timestamp holds until the next timestamp. During a bandwidth zero (an
+outage) nothing is transferred until the next timestamp, so a trace must
+have a bandwidth above zero and, if it doesn't start over, it can't end
+with an outage.
+
+The first time a trace is used its columns are converted to two NumPy files
+next to it (<trace>.timestamps.npy and <trace>.bandwidth.npy). They are
+memory-mapped afterwards, so a multi-hour trace takes no load time and a
+lookup (bisect on the timestamps) costs O(log n). The NumPy files are built
+again when the trace file is newer than them.
+
+When the session is longer than the trace, the trace starts over.
+"""
+
+import os
+from bisect import bisect_right
+
+import numpy as np
+
+
+class BandwidthTrace:
+
+    def __init__(self, file, scale=1.0, loop=True):
+        self.file = file
+        self.scale = scale
+        self.loop = loop
+
+        self.timestamps, self.bandwidth = self.load(file)
+        if len(self.timestamps) == 0:
+            raise ValueError(f'The bandwidth trace {file} is empty.')
+        if not np.any(self.bandwidth > 0):
+            raise ValueError(f'The bandwidth trace {file} has no bandwidth above zero.')
+        if not self.loop and self.bandwidth[-1] <= 0:
+            raise ValueError(f'The bandwidth trace {file} ends with an outage (bandwidth zero) that never ends, '
+                             f'it should start over (traffic_shaping_trace_loop).')
+
+        self.start_time = float(self.timestamps[0])
+        self.duration = float(self.timestamps[-1]) - self.start_time
+        # the last bandwidth holds for the mean interval between timestamps
+        if len(self.timestamps) > 1:
+            self.duration += self.duration / (len(self.timestamps) - 1)
+        else:
+            self.duration = 1.0
+
+    @staticmethod
+    def load(file):
+        timestamps_file = file + '.timestamps.npy'
+        bandwidth_file = file + '.bandwidth.npy'
+
+        trace_mtime = os.path.getmtime(file)
+        if not all(os.path.exists(f) and os.path.getmtime(f) >= trace_mtime for f in (timestamps_file, bandwidth_file)):
+            BandwidthTrace.convert(file, timestamps_file, bandwidth_file)
+
+        return np.load(timestamps_file, mmap_mode='r'), np.load(bandwidth_file, mmap_mode='r')
+
+    @staticmethod
+    def convert(file, timestamps_file, bandwidth_file):
+        with open(file) as f:
+            data = np.loadtxt((line.replace(',', ' ') for line in f), ndmin=2, usecols=(0, 1))
+
+        # a stable sort, so equal timestamps keep the trace order
+        data = data[np.argsort(data[:, 0], kind='stable')]
+
+        # write and rename, so a broken run never leaves a partial file
+        for column, column_file in ((0, timestamps_file), (1, bandwidth_file)):
+            with open(column_file + '.tmp', 'wb') as f:
+                np.save(f, np.ascontiguousarray(data[:, column]))
+            os.replace(column_file + '.tmp', column_file)
+
+    # it maps the session time to a position of the trace
+    def get_trace_time(self, current_time):
+        if self.loop:
+            return self.start_time + current_time % self.duration
+        return self.start_time + current_time
+
+    def get_bandwidth(self, current_time):
+        """
+        It returns the bandwidth (bits per second) at current_time (seconds since
+        the session has started).
+        """
+        position = max(bisect_right(self.timestamps, self.get_trace_time(current_time)) - 1, 0)
+        return float(self.bandwidth[position]) * self.scale
+
+    def get_next_change(self, current_time):
+        """
+        It returns the session time of the next bandwidth change after current_time.
+        """
+        trace_time = self.get_trace_time(current_time)
+        position = bisect_right(self.timestamps, trace_time)
+
+        if position < len(self.timestamps):
+            return current_time + float(self.timestamps[position]) - trace_time
+
+        if self.loop:
+            return current_time + self.start_time + self.duration - trace_time
+
+        # the last bandwidth holds forever
+        return float('inf')
@@ -10,31 +10,43 @@ The class responsible to retrieve segments in the web server.
 Also it implements a traffic shaping approach.
 """
 
+from base.event_log import DEBUG
 from base.simple_module import SimpleModule
 from base.message import Message, MessageKind, SSMessage
-from base.configuration_parser import ConfigurationParser
 from player.parser import *
-import http.client
+from connection.connection_pool import ConnectionPool
+from connection.segment_cache import SegmentCache
+from connection.http_trace import HTTPTraceRecorder, HTTPTraceReplayer
+from connection.token_bucket import TokenBucket
+from connection.bandwidth_trace import BandwidthTrace
+import math
 import time
-from scipy.stats import expon
-from base.timer import Timer
-import seaborn as sns
-import matplotlib.pyplot as plt
+
+import numpy as np
 
 
 class ConnectionHandler(SimpleModule):
 
-    def __init__(self, id):
-        SimpleModule.__init__(self, id)
+    def __init__(self, id, session=None):
+        SimpleModule.__init__(self, id, session)
         self.initial_time = 0
         self.qi = []
+        self.parsed_mpd = None
 
         # for traffic shaping
-        config_parser = ConfigurationParser.get_instance()
+        config_parser = self.session.config_parser
         self.traffic_shaping_interval = int(config_parser.get_parameter('traffic_shaping_profile_interval'))
         self.traffic_shaping_seed = int(config_parser.get_parameter('traffic_shaping_seed'))
         self.traffic_shaping_values = []
 
+        # a bandwidth trace (timestamp and bandwidth columns) replaces the traffic shaping profiles
+        self.bandwidth_trace = None
+        bandwidth_trace_file = config_parser.get_parameter('traffic_shaping_trace', '')
+        if bandwidth_trace_file:
+            self.bandwidth_trace = BandwidthTrace(bandwidth_trace_file,
+                                                  float(config_parser.get_parameter('traffic_shaping_trace_scale', 1)),
+                                                  bool(config_parser.get_parameter('traffic_shaping_trace_loop', True)))
+
         # mark the current traffic shapping interval
         self.current_traffic_shaping_interval = 0
 
@@ -53,46 +65,300 @@ class ConnectionHandler(SimpleModule):
             elif token[i] == 'H':
                 self.traffic_shaping_sequence.append(2)
 
-        self.timer = Timer.get_instance()
-
-    def get_traffic_shaping_positions(self):
-        current_tsi = self.timer.get_current_time() // self.traffic_shaping_interval
-
-        if current_tsi > self.current_traffic_shaping_interval:
-            self.current_traffic_shaping_interval = current_tsi
-            self.tss_position = (self.tss_position + 1) % len(self.traffic_shaping_sequence)
-
-        self.tsv_position = (self.tsv_position + 1) % len(self.traffic_shaping_values[0])
+        # persistent HTTP connections (http_keep_alive = false connects once per request)
+        self.connection_pool = ConnectionPool(bool(config_parser.get_parameter('http_keep_alive', True)),
+                                              float(config_parser.get_parameter('http_idle_timeout', 30)))
+
+        # optional on-disk segment cache, the download time is still emulated by the traffic shaping
+        self.segment_cache = None
+        if bool(config_parser.get_parameter('segment_cache', False)):
+            self.segment_cache = SegmentCache(config_parser.get_parameter('segment_cache_dir', './cache'),
+                                              int(config_parser.get_parameter('segment_cache_max_size', 1 << 30)),
+                                              bool(config_parser.get_parameter('segment_cache_store_content', False)))
+
+        # record or replay (without network access) the HTTP exchanges
+        self.http_trace_recorder = None
+        self.http_trace_replayer = None
+        http_trace_mode = str(config_parser.get_parameter('http_trace_mode', 'off')).lower()
+        http_trace_file = config_parser.get_parameter('http_trace_file', './results/http_trace.jsonl')
+        if http_trace_mode == 'record':
+            self.http_trace_recorder = HTTPTraceRecorder(http_trace_file)
+        elif http_trace_mode == 'replay':
+            self.http_trace_replayer = HTTPTraceReplayer(http_trace_file)
+        elif http_trace_mode != 'off':
+            raise ValueError(f'Invalid http_trace_mode parameter - {http_trace_mode}. It should be off, record or replay.')
+
+        # time spent in the last HTTP exchange
+        self.exchange_time = 0
+
+        # using the virtual clock, the round trip time (s) of the exchanges without traffic shaping
+        self.virtual_rtt = float(config_parser.get_parameter('virtual_rtt', 0.02))
+
+        # using the virtual clock, the time the emulated link finishes the current transfers
+        self.link_free_time = 0
+
+        # segments are read in chunks into a preallocated buffer and the payload is thrown away
+        self.read_buffer = memoryview(bytearray(int(config_parser.get_parameter('http_read_chunk_size', 65536))))
+
+        self.timer = self.session.timer
+
+        # post: the download time is adjusted after the segment is downloaded
+        # token_bucket: the socket reads are paced by a token bucket while the segment is downloaded
+        self.token_bucket = None
+        traffic_shaping_mode = str(config_parser.get_parameter('traffic_shaping_mode', 'post')).lower()
+        if traffic_shaping_mode == 'token_bucket':
+            burst_size = int(config_parser.get_parameter('traffic_shaping_burst_size', 16384))
+            self.token_bucket = TokenBucket(self.get_target_throughput, 8 * burst_size, self.timer.get_current_time,
+                                            next_change_function=self.get_next_throughput_change)
+            # a read never takes more than the bucket can hold
+            self.read_buffer = self.read_buffer[:min(len(self.read_buffer), burst_size)]
+        elif traffic_shaping_mode != 'post':
+            raise ValueError(f'Invalid traffic_shaping_mode parameter - {traffic_shaping_mode}. It should be post or token_bucket.')
+
+    def get_traffic_shaping_positions(self, current_time=None):
+        """
+        It returns the (sequence, values) positions of the traffic shaping profile at
+        current_time: the profile changes every traffic_shaping_interval seconds and
+        a new value of it is used every second.
+        """
+        if current_time is None:
+            current_time = self.timer.get_current_time()
+
+        self.current_traffic_shaping_interval = int(current_time // self.traffic_shaping_interval)
+        self.tss_position = self.current_traffic_shaping_interval % len(self.traffic_shaping_sequence)
+        self.tsv_position = int(current_time) % len(self.traffic_shaping_values[0])
 
         return (self.tss_position, self.tsv_position)
 
+    def get_target_throughput(self, current_time):
+        """
+        It returns the target throughput (bits per second) at current_time, from the
+        bandwidth trace or from the traffic shaping profile.
+        """
+        if self.bandwidth_trace is not None:
+            return self.bandwidth_trace.get_bandwidth(current_time)
+
+        tsp = self.get_traffic_shaping_positions(current_time)
+        return self.traffic_shaping_values[self.traffic_shaping_sequence[tsp[0]]][tsp[1]]
+
+    def get_next_throughput_change(self, current_time):
+        if self.bandwidth_trace is not None:
+            return self.bandwidth_trace.get_next_change(current_time)
+        return math.floor(current_time) + 1
+
+    def get_virtual_exchange_time(self, bit_length=0):
+        """
+        Using the virtual clock, it returns the duration (s) of a HTTP exchange without traffic
+        shaping (the MPD file and the 404 responses): the virtual_rtt plus the transfer of
+        bit_length at the target throughput. It doesn't depend on the real network, so the
+        virtual sessions are reproducible.
+        """
+        delay = self.virtual_rtt
+        if bit_length > 0:
+            throughput = self.get_target_throughput(self.timer.get_current_time())
+            if throughput > 0:
+                delay += bit_length / throughput
+        return delay
+
     def initialize(self):
         # self.send_down(Message(MessageKind.SEGMENT_REQUEST, 'Olá Mundo'))
 
         pass
 
-    def bandwidth_limitation(self, package_size=0):
+    def bandwidth_limitation(self, package_size=0, start_time=None):
+        """
+        Emulates the traffic shaping profile for a package already downloaded.
+        Using the token bucket the package was paced while it was downloaded.
+        Using the real clock it sleeps until the target throughput is achieved.
+        Using the virtual clock nothing sleeps, it returns the emulated download
+        time (package size divided by the target throughput at start_time, the
+        current time by default) to be used as the response delay.
+        """
         if package_size == 0:
-            return
-
-        tsp = self.get_traffic_shaping_positions()
-        target_throughput = self.traffic_shaping_values[self.traffic_shaping_sequence[tsp[0]]][tsp[1]]
-
-        print(f'Execution Time {self.timer.get_current_time()} > target throughput: {target_throughput} - profile: ({self.traffic_shaping_sequence[tsp[0]]}, {tsp[1]})')
+            return 0
+
+        current_time = self.timer.get_current_time()
+        if start_time is None or not self.timer.is_virtual():
+            start_time = current_time
+
+        # the transfer is shaped by the token bucket, using the virtual clock its duration is computed here
+        if self.token_bucket is not None:
+            if self.timer.is_virtual():
+                return self.token_bucket.get_transfer_time(package_size, start_time)
+            return 0
+
+        if self.event_log.is_enabled(DEBUG):
+            target_throughput = self.get_target_throughput(start_time)
+            if self.bandwidth_trace is not None:
+                self.event_log.debug('target_throughput', 'Execution Time {time} > target throughput: {throughput} - trace: {trace}',
+                                     throughput=target_throughput, trace=self.bandwidth_trace.file)
+            else:
+                self.event_log.debug('target_throughput', 'Execution Time {time} > target throughput: {throughput} - profile: ({profile}, {position})',
+                                     throughput=target_throughput, profile=self.traffic_shaping_sequence[self.tss_position],
+                                     position=self.tsv_position)
+
+        if self.timer.is_virtual():
+            return self.get_shaped_transfer_time(package_size, start_time)
 
         rtt = time.perf_counter() - self.initial_time
-        throughput = package_size / rtt
+        transfer_time = self.get_shaped_transfer_time(package_size, start_time)
 
         # we didn't pass our throughput go
-        if target_throughput >= throughput:
-            return
-
-        waiting_time = (package_size - (target_throughput * rtt)) / target_throughput
-        time.sleep(waiting_time)
+        if transfer_time <= rtt:
+            return 0
+
+        time.sleep(transfer_time - rtt)
+        return 0
+
+    def get_shaped_transfer_time(self, package_size, start_time):
+        """
+        It returns the duration (s) of a transfer of package_size bits started at start_time
+        at the target throughput. A zero throughput (an outage of the bandwidth trace)
+        transfers nothing, the transfer starts at the next change of the trace.
+        """
+        transfer_start = start_time
+        target_throughput = self.get_target_throughput(transfer_start)
+        while target_throughput <= 0:
+            transfer_start = self.get_next_throughput_change(transfer_start)
+            target_throughput = self.get_target_throughput(transfer_start)
+
+        return transfer_start - start_time + package_size / target_throughput
 
     def finalization(self):
-        pass
-
+        self.connection_pool.close()
+
+        if self.http_trace_recorder is not None:
+            self.http_trace_recorder.close()
+
+    # host_name may define a port (host:port), otherwise the port 80 is used
+    def split_host_name(self, host_name):
+        host, _, port = host_name.partition(':')
+        return host, int(port) if port else 80
+
+    def http_get(self, host_name, path_name, keep_content=False):
+        """
+        It downloads path_name from host_name using the connection pool and returns
+        a tuple (status, content, size). In replay mode the exchange comes from the
+        HTTP trace and the content is available only for MPD files.
+        keep_content tells the recorder to store the content in the trace.
+        """
+        url = path_name if path_name.startswith('http://') else f'http://{host_name}{path_name}'
+
+        if self.http_trace_replayer is not None:
+            exchange = self.http_trace_replayer.get_exchange(url)
+            if exchange is None:
+                self.event_log.warning('trace_miss', 'Execution Time {time} > {url} is not in the HTTP trace, '
+                                                     'replayed as 404 Not Found', url=url)
+                self.exchange_time = 0
+                return 404, None, 0
+
+            self.exchange_time = exchange['time']
+            content = exchange.get('content')
+            if content is not None:
+                content = content.encode()
+            return exchange['status'], content, exchange['size']
+
+        started_time = time.perf_counter()
+
+        host, port = self.split_host_name(host_name)
+        connection, response = self.connection_pool.request(host, port, path_name)
+        content = response.read()
+        self.connection_pool.release(connection, response)
+
+        self.exchange_time = time.perf_counter() - started_time
+
+        if self.http_trace_recorder is not None:
+            self.http_trace_recorder.record(url, response.status, len(content), self.exchange_time,
+                                            content.decode() if keep_content else None)
+
+        return response.status, content, len(content)
+
+    def stream_segment(self, host_name, path_name, keep_content=False):
+        """
+        It downloads the segment reading the response in chunks into the preallocated
+        read buffer. Only the number of bytes and the arrival of each chunk are kept,
+        the payload is thrown away unless keep_content is True.
+        It returns a tuple (status, size, chunk arrivals, content), where the chunk
+        arrivals is a list of (seconds since the request, chunk size in bytes).
+        """
+        started_time = time.perf_counter()
+
+        host, port = self.split_host_name(host_name)
+        connection, response = self.connection_pool.request(host, port, path_name)
+
+        size = 0
+        chunk_arrivals = []
+        content = bytearray() if keep_content else None
+
+        while True:
+            chunk_size = response.readinto(self.read_buffer)
+            if chunk_size == 0:
+                break
+            size += chunk_size
+            # using the virtual clock the transfer time is computed later, nothing sleeps here
+            if self.token_bucket is not None and not self.timer.is_virtual():
+                self.token_bucket.consume(8 * chunk_size)
+            chunk_arrivals.append((time.perf_counter() - started_time, chunk_size))
+            if keep_content:
+                content += self.read_buffer[:chunk_size]
+
+        self.connection_pool.release(connection, response)
+
+        self.exchange_time = time.perf_counter() - started_time
+
+        if self.http_trace_recorder is not None:
+            self.http_trace_recorder.record(path_name, response.status, size, self.exchange_time)
+
+        return response.status, size, chunk_arrivals, content
+
+    # it returns the url of the requested segment, or None if the segment is after the end of
+    # the SegmentTimeline (it is not found, as a segment after the last one of the server)
+    def get_segment_url(self, msg):
+        try:
+            return msg.get_url()
+        except IndexError:
+            return None
+
+    def pace_transfer(self, size):
+        # the segments that don't come through the socket (cached or replayed) go through
+        # the token bucket as a whole, so their download time still follows the profile
+        if self.token_bucket is not None and not self.timer.is_virtual():
+            self.token_bucket.consume(8 * size)
+
+    def retrieve_segment(self, host_name, path_name):
+        """
+        It returns a tuple (found, size in bytes, chunk arrivals) of the segment,
+        looking for it in the segment cache before downloading it from the server.
+        There are no chunk arrivals for cached and replayed segments.
+        """
+        if self.segment_cache is not None:
+            size = self.segment_cache.get_size(path_name)
+            if size is not None:
+                self.pace_transfer(size)
+                return True, size, []
+
+        # replayed segment, there is no content
+        if self.http_trace_replayer is not None:
+            status, ss_file, size = self.http_get(host_name, path_name)
+            if status != 200:
+                return False, 0, []
+            self.pace_transfer(size)
+            return True, size, []
+
+        keep_content = self.segment_cache is not None and self.segment_cache.store_content
+        status, size, chunk_arrivals, content = self.stream_segment(host_name, path_name, keep_content)
+
+        # 404 Not Found means there are no more segments to download
+        if status != 200:
+            return False, 0, []
+
+        if self.segment_cache is not None:
+            if keep_content:
+                self.segment_cache.put(path_name, bytes(content))
+            else:
+                self.segment_cache.put_size(path_name, size)
+
+        return True, size, chunk_arrivals
 
     def handle_xml_request(self, msg):
         if not 'http://' in msg.get_payload():
@@ -101,79 +367,118 @@ class ConnectionHandler(SimpleModule):
         self.initial_time = time.perf_counter()
 
         url_tokens = msg.get_payload().split('/')[2:]
-        port = '80'
         host_name = url_tokens[0]
         path_name = '/' + '/'.join(url_tokens[1:])
         mdp_file = ''
 
         try:
-            connection = http.client.HTTPConnection(host_name, port)
-            connection.request('GET', path_name)
-            mdp_file = connection.getresponse().read().decode()
-            connection.close()
+            status, content, size = self.http_get(host_name, path_name, keep_content=True)
+            if status != 200:
+                if self.http_trace_replayer is not None:
+                    raise ValueError('The MPD file is not in the HTTP trace, record and replay with the same url_mpd')
+                raise ValueError(f'The MPD request returned the HTTP status {status}')
+            mdp_file = content.decode()
         except Exception as err:
-            print('> Houston, we have a problem!')
-            print(f'> trying to connecto to: {msg.get_payload()}')
-            print(err)
+            self.event_log.error('connection_error', '> Houston, we have a problem!\n> trying to connecto to: {url}\n{error}',
+                                 url=msg.get_payload(), error=err)
             exit(-1)
 
         msg = Message(MessageKind.XML_RESPONSE, mdp_file)
         msg.add_bit_length(8 * len(mdp_file))
 
-        parsed_mpd = parse_mpd(msg.get_payload())
-        self.qi = parsed_mpd.get_qi()
+        # parsed once, the other modules get it from the message
+        self.parsed_mpd = parse_mpd(msg.get_payload())
+        msg.add_parsed_mpd(self.parsed_mpd)
+        self.qi = self.parsed_mpd.get_qi()
 
         increase_factor = 1
         low = round(self.qi[len(self.qi) - 1] * increase_factor)
         medium = round(self.qi[(len(self.qi) // 2) - 1] * increase_factor)
         high = round(self.qi[0] * increase_factor)
 
-        self.traffic_shaping_values.append(
-            expon.rvs(scale=1, loc=low, size=1000, random_state=self.traffic_shaping_seed))
-        self.traffic_shaping_values.append(
-            expon.rvs(scale=1, loc=medium, size=1000, random_state=self.traffic_shaping_seed))
-        self.traffic_shaping_values.append(
-            expon.rvs(scale=1, loc=high, size=1000, random_state=self.traffic_shaping_seed))
+        # exponential samples shifted by each profile throughput, the same values
+        # scipy.stats.expon.rvs(scale=1, loc=..., size=1000, random_state=seed) returns
+        samples = np.random.RandomState(self.traffic_shaping_seed).standard_exponential(1000)
+        for loc in (low, medium, high):
+            self.traffic_shaping_values.append(samples + loc)
 
-        self.send_up(msg)
+        # the mpd file is not shaped, using the virtual clock its exchange time is emulated
+        delay = 0
+        if self.timer.is_virtual():
+            delay = self.get_virtual_exchange_time(msg.get_bit_length())
+
+        self.send_up(msg, delay)
 
     def handle_segment_size_request(self, msg):
-        port = '80'
         host_name = msg.get_host_name()
-        path_name = msg.get_url()
-        ss_file = ''
+        path_name = self.get_segment_url(msg)
         self.initial_time = time.perf_counter()
 
-        print(f'Execution Time {self.timer.get_current_time()} > selected QI: {self.qi.index(msg.get_quality_id())}')
+        if self.event_log.is_enabled(DEBUG):
+            self.event_log.debug('selected_qi', 'Execution Time {time} > selected QI: {qi}',
+                                 qi=self.parsed_mpd.get_qi_index(msg.get_quality_id()), segment_id=msg.get_segment_id())
 
         try:
-            connection = http.client.HTTPConnection(host_name, port)
-            connection.request('GET', path_name)
-            ss_file = connection.getresponse().read()
-            connection.close()
+            if path_name is None:
+                found, size, chunk_arrivals = False, 0, []
+            else:
+                found, size, chunk_arrivals = self.retrieve_segment(host_name, path_name)
         except Exception as err:
-            print('> Houston, we have a problem!')
-            print(f'> trying to connecto to: {msg.get_payload()}')
-            print(err)
+            self.event_log.error('connection_error', '> Houston, we have a problem!\n> trying to connecto to: {url}\n{error}',
+                                 url=msg.get_payload(), error=err)
             exit(-1)
 
-
         msg.set_kind(MessageKind.SEGMENT_RESPONSE)
 
-        decoded = False
+        delay = 0
 
-        try:
-            ss_file = ss_file.decode()
-        except UnicodeDecodeError:
-            # if wasn't possible to decode() is a ss
-            msg.add_bit_length(8 * len(ss_file))
-            self.bandwidth_limitation(msg.get_bit_length())
-            decoded = True
-
-        if not decoded and '404 Not Found' in ss_file:
+        if found and size > 0:
+            msg.add_bit_length(8 * size)
+        else:
             msg.set_found(False)
 
-        self.send_up(msg)
+        if self.timer.is_virtual():
+            delay, chunk_arrivals = self.emulate_link_transfer(msg, size, chunk_arrivals)
+        elif msg.found():
+            delay = self.bandwidth_limitation(msg.get_bit_length())
+
+        if msg.found():
+            msg.add_chunk_arrivals(chunk_arrivals)
+
+        self.send_up(msg, delay)
+
+    def emulate_link_transfer(self, msg, size, chunk_arrivals):
+        """
+        Using the virtual clock, the emulated link transfers one response at a time, found
+        or not, so pipelined responses share the link and arrive in the request order. It
+        returns a tuple (response delay, emulated chunk arrivals).
+        """
+        current_time = self.timer.get_current_time()
+        start_time = max(current_time, self.link_free_time)
+
+        if msg.found():
+            # the target throughput depends on when the transfer starts
+            transfer_time = self.bandwidth_limitation(msg.get_bit_length(), start_time)
+            chunk_arrivals = self.emulate_chunk_arrivals(chunk_arrivals, size, transfer_time, start_time)
+        else:
+            # responses without traffic shaping take the emulated HTTP exchange time
+            transfer_time = self.get_virtual_exchange_time()
+
+        self.link_free_time = start_time + transfer_time
+        return self.link_free_time - current_time, chunk_arrivals
+
+    # it moves the chunk arrivals to a download of 'size' bytes that takes 'download_time' seconds,
+    # at constant rate or, using the token bucket, at the rate of the profile since start_time
+    def emulate_chunk_arrivals(self, chunk_arrivals, size, download_time, start_time=0):
+        emulated = []
+        received = 0
+        for arrival_time, chunk_size in chunk_arrivals:
+            received += chunk_size
+            if self.token_bucket is not None:
+                emulated.append((self.token_bucket.get_transfer_time(8 * received, start_time), chunk_size))
+            else:
+                emulated.append((download_time * received / size, chunk_size))
+        return emulated
 
     def handle_segment_size_response(self, msg):
         pass
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+A per-host pool of persistent HTTP/1.1 connections used by the ConnectionHandler.
+
+When keep-alive is enabled, a connection is returned to the pool after its
+response has been completely read and it is reused by the next request to the
+same host. Connections idle for more than idle_timeout seconds are evicted,
+and a request sent over a reused connection that was closed by the server is
+transparently retried over a new one.
+
+When keep-alive is disabled, every request opens a new connection that is
+closed right after the response is read (connect-per-request behaviour).
+"""
+
+import http.client
+import time
+
+# errors raised when a reused connection was closed by the other side
+BROKEN_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                            http.client.BadStatusLine, BrokenPipeError, ConnectionResetError,
+                            ConnectionAbortedError)
+
+
+class ConnectionPool:
+
+    def __init__(self, keep_alive=True, idle_timeout=30):
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+
+        # (host, port) -> list of [connection, last used time]
+        self.idle_connections = {}
+
+    def evict_idle_connections(self):
+        now = time.monotonic()
+        for key, idle in self.idle_connections.items():
+            alive = []
+            for connection, last_used in idle:
+                if now - last_used > self.idle_timeout:
+                    connection.close()
+                else:
+                    alive.append((connection, last_used))
+            self.idle_connections[key] = alive
+
+    def get_connection(self, host, port):
+        """
+        It returns a tuple (connection, reused) with an idle connection to the host
+        if there is one available, or a new connection otherwise.
+        """
+        if self.keep_alive:
+            self.evict_idle_connections()
+            idle = self.idle_connections.get((host, port))
+            if idle:
+                return idle.pop()[0], True
+
+        return http.client.HTTPConnection(host, port), False
+
+    def release(self, connection, response):
+        """
+        It must be called after the response was completely read. The connection
+        returns to the pool or is closed if it can't be reused.
+        """
+        if not self.keep_alive or response.will_close:
+            connection.close()
+            return
+
+        key = (connection.host, connection.port)
+        self.idle_connections.setdefault(key, []).append((connection, time.monotonic()))
+
+    def request(self, host, port, path_name, method='GET'):
+        """
+        It sends the request and returns a tuple (connection, response). The response
+        must be read and the connection released by the caller.
+        """
+        connection, reused = self.get_connection(host, port)
+
+        try:
+            connection.request(method, path_name)
+            return connection, connection.getresponse()
+        except BROKEN_CONNECTION_ERRORS:
+            connection.close()
+            if not reused:
+                raise
+
+        # the server has closed the idle connection, reconnecting
+        connection = http.client.HTTPConnection(host, port)
+        connection.request(method, path_name)
+        return connection, connection.getresponse()
+
+    def close(self):
+        for idle in self.idle_connections.values():
+            for connection, last_used in idle:
+                connection.close()
+        self.idle_connections = {}
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+Record and replay of the HTTP exchanges made by the ConnectionHandler.
+
+The recorder appends one JSON line per exchange to the trace file:
+
+    {"url": ..., "status": 200, "size": 808056, "time": 0.012345}
+
+where size is the response length in bytes and time the seconds spent in
+the exchange. MPD responses also store their content, so a trace has
+everything needed to run a session again without any network access.
+The replayer loads a trace file and serves the recorded exchanges back
+(when an url appears more than once, the last record is used). The urls the
+recording session didn't request (e.g. the segments after the last one
+requested with a different pipeline depth) are not found.
+"""
+
+import json
+
+
+class HTTPTraceRecorder:
+
+    def __init__(self, file_name):
+        self.trace_file = open(file_name, 'a')
+
+    def record(self, url, status, size, elapsed_time, content=None):
+        exchange = {'url': url, 'status': status, 'size': size, 'time': round(elapsed_time, 6)}
+        if content is not None:
+            exchange['content'] = content
+
+        self.trace_file.write(json.dumps(exchange, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.trace_file.close()
+
+
+class HTTPTraceReplayer:
+
+    def __init__(self, file_name):
+        self.exchanges = {}
+
+        with open(file_name) as f:
+            for line in f:
+                if line.strip():
+                    exchange = json.loads(line)
+                    self.exchanges[exchange['url']] = exchange
+
+    def get_exchange(self, url):
+        """
+        It returns the recorded exchange of the url, a dict with the url, status,
+        size, time and (for MPD files) content keys, or None if it was not recorded.
+        """
+        return self.exchanges.get(url)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+An on-disk segment cache used by the ConnectionHandler.
+
+Entries are keyed by the segment URL and stored in files named after the
+SHA-1 of that URL. A cache entry keeps the segment content (.seg file) or
+only the segment size (.size file), so replaying the same MPD does not need
+to download its segments again. The total size of the cache directory is
+bounded and the least recently used entries are evicted first. The LRU order
+survives between runs through the files modification time.
+
+Only segments that were found in the server are cached.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+
+class SegmentCache:
+
+    def __init__(self, directory, max_size, store_content=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.store_content = store_content
+
+        # key -> (file name, bytes used in disk, segment size), ordered from LRU to MRU
+        self.entries = OrderedDict()
+        self.used_size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.load_entries()
+
+    def load_entries(self):
+        files = []
+        for file_name in os.listdir(self.directory):
+            key, extension = os.path.splitext(file_name)
+            if extension not in ('.seg', '.size'):
+                continue
+            stat = os.stat(os.path.join(self.directory, file_name))
+            files.append((stat.st_mtime, key, file_name, stat.st_size))
+
+        for mtime, key, file_name, disk_size in sorted(files):
+            if file_name.endswith('.seg'):
+                segment_size = disk_size
+            else:
+                with open(os.path.join(self.directory, file_name)) as f:
+                    segment_size = int(f.read())
+
+            self.entries[key] = (file_name, disk_size, segment_size)
+            self.used_size += disk_size
+
+        self.evict()
+
+    def get_key(self, url):
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def get_size(self, url):
+        """
+        It returns the segment size (in bytes) stored for the url or None if
+        the segment is not cached.
+        """
+        key = self.get_key(url)
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        os.utime(os.path.join(self.directory, entry[0]))
+        return entry[2]
+
+    def put(self, url, content):
+        if self.store_content:
+            self.store(url, '.seg', content, len(content))
+        else:
+            self.put_size(url, len(content))
+
+    # it stores only the segment size, even if the cache is storing contents
+    def put_size(self, url, size):
+        self.store(url, '.size', str(size).encode(), size)
+
+    def store(self, url, extension, data, segment_size):
+        key = self.get_key(url)
+        if key in self.entries:
+            return
+
+        file_name = key + extension
+
+        # write and rename, so a broken run never leaves a partial entry
+        path = os.path.join(self.directory, file_name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+        self.entries[key] = (file_name, len(data), segment_size)
+        self.used_size += len(data)
+        self.evict()
+
+    def evict(self):
+        while self.used_size > self.max_size and self.entries:
+            key, (file_name, disk_size, segment_size) = self.entries.popitem(last=False)
+            self.used_size -= disk_size
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
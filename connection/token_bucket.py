@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+A token bucket used to shape the segment transfers while they happen.
+
+Tokens (bits) are added to the bucket at the rate given by rate_function(t),
+where t is the session time in seconds, up to burst_size bits. Every chunk
+read from the socket takes its size from the bucket; when the bucket is in
+debt the reader waits until it is paid off, so the transfer behaves like a
+bottleneck link whose rate follows the traffic shaping profile. The rate is
+evaluated again at least every max_sleep seconds, so rate changes inside a
+segment take effect immediately.
+
+The rate function is constant between the times given by
+next_change_function(t), by default at every second of the session (the
+traffic shaping profiles draw one value per second), which allows the
+transfer time of a package to be computed without sleeping (virtual clock).
+"""
+
+import math
+import time
+
+
+class TokenBucket:
+
+    def __init__(self, rate_function, burst_size, clock, max_sleep=0.05, next_change_function=None):
+        self.rate_function = rate_function
+        self.next_change_function = next_change_function
+        self.burst_size = burst_size
+        self.clock = clock
+        self.max_sleep = max_sleep
+
+        self.tokens = burst_size
+        self.last_update = None
+
+    def refill(self):
+        now = self.clock()
+        if self.last_update is not None:
+            self.tokens = min(self.burst_size, self.tokens + self.rate_function(now) * (now - self.last_update))
+        self.last_update = now
+        return now
+
+    def get_waiting_time(self):
+        """
+        It returns the seconds to wait until the bucket is not in debt.
+        """
+        now = self.refill()
+        if self.tokens >= 0:
+            return 0
+        rate = self.rate_function(now)
+        # no bandwidth at all (a trace outage), look again later
+        if rate <= 0:
+            return self.max_sleep
+        return -self.tokens / rate
+
+    def reserve(self, bits):
+        """
+        It takes the bits from the bucket (it can be left in debt) and returns the
+        seconds to wait before reading more data. Used by the asyncio transfers.
+        """
+        self.refill()
+        self.tokens -= bits
+        return min(self.get_waiting_time(), self.max_sleep)
+
+    def consume(self, bits):
+        # blocking version of reserve()
+        waiting_time = self.reserve(bits)
+        while waiting_time > 0:
+            time.sleep(waiting_time)
+            waiting_time = min(self.get_waiting_time(), self.max_sleep)
+
+    def get_transfer_time(self, bits, start_time):
+        """
+        It returns the seconds needed to transfer the bits through the bucket
+        starting at start_time, integrating the rate function between its changes.
+        """
+        current_time = start_time
+        while True:
+            rate = self.rate_function(current_time)
+            if self.next_change_function is None:
+                next_change = math.floor(current_time) + 1
+            else:
+                # a rounding error never stops the integration
+                next_change = max(self.next_change_function(current_time), math.nextafter(current_time, math.inf))
+
+            if rate <= 0:
+                if next_change == math.inf:
+                    raise ValueError('The bandwidth never becomes greater than zero.')
+                current_time = next_change
+                continue
+
+            capacity = rate * (next_change - current_time)
+
+            if bits <= capacity:
+                return current_time + bits / rate - start_time
+
+            bits -= capacity
+            current_time = next_change
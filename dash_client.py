@@ -9,42 +9,121 @@ layer model (Player, R2A and Connection_Handler).
 There isn't a strong relation among the entities
 (they don't know each other). The Dash_client is
 responsible to make the communication among them happens.
+
+The module stack comes from the module_stack parameter (by default Player,
+R2A and ConnectionHandler), so other layers (e.g. a PassThroughModule
+subclass) can be inserted between them. The module ids are their positions
+in the stack.
+
+With the profile parameter every message dispatch is timed by module and
+MessageKind (see base.profiler). With profile_cprofile the session also
+runs under cProfile and the statistics are written to profile.pstats (and
+a text summary to profile.txt) in the results directory.
 """
 
+import cProfile
 import importlib
+import os
+import pstats
+import time
 
-from base.configuration_parser import ConfigurationParser
-from base.scheduler import Scheduler
+from base.profiler import HandlerProfiler
+from base.session import Session
+from base.simple_module import SimpleModule
 from connection.connection_handler import ConnectionHandler
+from connection.async_connection_handler import AsyncConnectionHandler
 from player.player import Player
 
+# the default module stack, from the top (id 0) to the bottom
+DEFAULT_MODULE_STACK = ['Player', 'R2A', 'ConnectionHandler']
 
-class DashClient:
 
-    def __init__(self):
-        config_parser = ConfigurationParser.get_instance()
+class Unroutable(SimpleModule):
+    """
+    The sentinels placed above the top and below the bottom of the module stack.
+    A message sent to them can't be delivered.
+    """
 
-        r2a_algorithm = str(config_parser.get_parameter('r2a_algorithm'))
+    def initialize(self):
+        pass
 
-        self.scheduler = Scheduler()
+    def finalization(self):
+        pass
 
-        self.modules = []
+    def handle_message(self, msg):
+        print(f'It is no possible to route a {msg} message to the {self.id} module list position.')
+        exit(0)
 
-        # adding modules to manage
-        self.player = Player(0)
+    handle_xml_request = handle_xml_response = handle_message
+    handle_segment_size_request = handle_segment_size_response = handle_message
+
+
+class DashClient:
 
-        # automatic loading class by the name
-        r2a_class = getattr(importlib.import_module('r2a.' + r2a_algorithm.lower()), r2a_algorithm)
-        self.r2a = r2a_class(1)
+    def __init__(self, session=None):
+        # by default the process-wide services (singletons) are used
+        self.session = session if session is not None else Session.get_default()
 
-        self.connection_handler = ConnectionHandler(2)
+        config_parser = self.session.config_parser
 
-        self.modules.append(self.player)
-        self.modules.append(self.r2a)
-        self.modules.append(self.connection_handler)
+        self.r2a_algorithm = str(config_parser.get_parameter('r2a_algorithm'))
+        self.connection_backend = str(config_parser.get_parameter('connection_backend', 'sync')).lower()
+        module_stack = config_parser.get_parameter('module_stack', DEFAULT_MODULE_STACK)
+        self.profile = bool(config_parser.get_parameter('profile', False))
+        self.profile_cprofile = bool(config_parser.get_parameter('profile_cprofile', False))
+        self.results_dir = config_parser.get_parameter('results_dir', './results')
 
+        self.scheduler = self.session.scheduler
+
+        self.modules = []
+        self.player = None
+        self.r2a = None
+        self.connection_handler = None
+
+        # modules created inside this block belong to this session
+        with self.session.activate():
+            for id, name in enumerate(module_stack):
+                self.modules.append(self.create_module(name, id))
+
+            # routes[id + 1] is the module with the id, the sentinels take the messages sent out of the stack
+            self.routes = [Unroutable(-1)] + self.modules + [Unroutable(len(self.modules))]
+
+    def create_module(self, name, id):
+        """
+        It creates the module 'name' of the module stack: Player, R2A (the r2a_algorithm
+        parameter), ConnectionHandler (the connection_backend parameter) or the full
+        name (package.module.Class) of any other SimpleModule.
+        """
+        if name == 'Player':
+            self.player = Player(id)
+            return self.player
+
+        if name == 'R2A':
+            # automatic loading class by the name
+            r2a_class = getattr(importlib.import_module('r2a.' + self.r2a_algorithm.lower()), self.r2a_algorithm)
+            self.r2a = r2a_class(id)
+            return self.r2a
+
+        if name == 'ConnectionHandler':
+            # the asyncio backend keeps many segment requests outstanding
+            if self.connection_backend == 'asyncio':
+                self.connection_handler = AsyncConnectionHandler(id)
+            elif self.connection_backend == 'sync':
+                self.connection_handler = ConnectionHandler(id)
+            else:
+                raise ValueError(f'Invalid connection_backend parameter - {self.connection_backend}. It should be sync or asyncio.')
+            return self.connection_handler
+
+        module_name, _, class_name = name.rpartition('.')
+        if not module_name:
+            raise ValueError(f'Invalid module_stack entry - {name}. It should be Player, R2A, ConnectionHandler or package.module.Class.')
+        return getattr(importlib.import_module(module_name), class_name)(id)
 
     def run_application(self):
+        if self.profile:
+            self.run_profiled_application()
+            return
+
         self.modules_initialization()
 
         while not self.scheduler.is_empty():
@@ -52,17 +131,52 @@ class DashClient:
             self.handle_scheduler_event(event)
 
         self.modules_finalization()
+        self.session.event_log.close()
 
 
     def handle_scheduler_event(self, event):
-
-        #checking if the event is inside of the modules position range limits
-        if event.get_dst() < 0 or event.get_dst() >= len(self.modules):
-            print(f'It is no possible to route a {event.get_msg()} message from {event.get_src()} to {event.get_dst()} module list position.')
-            exit(0)
-
-        self.modules[event.get_dst()].handle_message(event.get_msg())
-
+        # messages sent out of the module stack reach the sentinels
+        self.routes[event.destination + 1].handle_message(event.msg)
+
+    def run_profiled_application(self):
+        handler_profiler = HandlerProfiler()
+        code_profiler = cProfile.Profile() if self.profile_cprofile else None
+        started_time = time.perf_counter()
+
+        if code_profiler is not None:
+            code_profiler.enable()
+
+        # the report is written even if a module ends the session with exit()
+        try:
+            self.modules_initialization()
+
+            while not self.scheduler.is_empty():
+                event = self.scheduler.get_event()
+                module = self.routes[event.destination + 1]
+                # the modules may change the kind of the message they handle
+                kind = event.msg.kind
+
+                handler_started_time = time.perf_counter_ns()
+                module.handle_message(event.msg)
+                handler_profiler.add(module, kind, time.perf_counter_ns() - handler_started_time)
+
+            self.modules_finalization()
+        finally:
+            if code_profiler is not None:
+                code_profiler.disable()
+                self.save_code_profile(code_profiler)
+
+            report = handler_profiler.get_report(time.perf_counter() - started_time)
+            handler_profiler.print_report(report)
+            handler_profiler.save(report, self.results_dir)
+            self.session.event_log.close()
+
+    def save_code_profile(self, code_profiler):
+        os.makedirs(self.results_dir, exist_ok=True)
+        code_profiler.dump_stats(os.path.join(self.results_dir, 'profile.pstats'))
+
+        with open(os.path.join(self.results_dir, 'profile.txt'), 'w') as f:
+            pstats.Stats(code_profiler, stream=f).sort_stats('cumulative').print_stats(50)
 
 
     def modules_initialization(self):
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+A local DASH origin server, a stand-in for the remote one in load,
+regression and benchmark runs.
+
+It generates a synthetic MPD with a bitrate ladder, a segment duration and
+a number of segments, and serves segments of the right size for each
+bitrate (bitrate * duration / 8 bytes, filled with zeros). Segments after
+the last one get 404 Not Found, which ends the session. Optionally each
+connection is limited to a rate (bits per second) and each response is
+delayed by a latency (seconds).
+
+The MPD is served at http://host:port/<name>/<name>.mpd and the segments
+at http://host:port/<name>/<bitrate>bps/segment_<number>.m4s.
+
+Usage: python3 -m origin.origin_server [--port 8080] [--ladder 46980,91917,...]
+       [--segment-duration 1] [--segment-count 600] [--rate 0] [--latency 0]
+
+It can also run inside another program (e.g. the benchmarks):
+
+    origin = OriginServer(port=0, segment_count=20)
+    origin.start()
+    url_mpd = origin.get_mpd_url()
+    ...
+    origin.stop()
+"""
+
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# the BigBuckBunny bitrate ladder of the remote server (bps)
+DEFAULT_LADDER = [46980, 91917, 135410, 182366, 226106, 270316, 352546, 424520, 537825, 620705, 808057, 1071529,
+                  1312787, 1662809, 2234145, 2617284, 3305118, 3841983, 4242923, 4726737]
+
+# the segments are written in blocks of this size (bytes)
+WRITE_BLOCK_SIZE = 16384
+
+SEGMENT_PATH = re.compile(r'/(\d+)bps/segment_(\d+)\.m4s$')
+
+
+def build_mpd(ladder, segment_duration, segment_count, name='synthetic'):
+    """
+    It returns a static MPD (str) with one video adaptation set, a representation for each
+    bitrate of the ladder and a SegmentTemplate with segment_count segments of segment_duration (s).
+    """
+    duration = segment_duration * segment_count
+    representations = ''.join(
+        f'      <Representation id="{bandwidth}bps" mimeType="video/mp4" codecs="avc1" width="480" height="360" '
+        f'bandwidth="{bandwidth}"/>\n' for bandwidth in sorted(ladder))
+
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{duration:.3f}S" minBufferTime="PT{segment_duration:.3f}S" profiles="urn:mpeg:dash:profile:isoff-live:2011">
+  <ProgramInformation><Title>{name}</Title></ProgramInformation>
+  <Period duration="PT{duration:.3f}S">
+    <AdaptationSet segmentAlignment="true" mimeType="video/mp4" contentType="video">
+      <SegmentTemplate timescale="1000" duration="{round(segment_duration * 1000)}" startNumber="1" media="$Bandwidth$bps/segment_$Number$.m4s" initialization="$Bandwidth$bps/init.mp4"/>
+{representations}    </AdaptationSet>
+  </Period>
+</MPD>
+'''
+
+
+class OriginServer:
+
+    def __init__(self, host='127.0.0.1', port=8080, ladder=None, segment_duration=1.0, segment_count=600,
+                 rate=0, latency=0, name='synthetic'):
+        self.ladder = sorted(ladder or DEFAULT_LADDER)
+        self.segment_duration = segment_duration
+        self.segment_count = segment_count
+        # per connection rate limit (bits per second), zero means no limit
+        self.rate = rate
+        # delay (s) before each response
+        self.latency = latency
+        self.name = name
+
+        self.mpd = build_mpd(self.ladder, self.segment_duration, self.segment_count, self.name).encode()
+        self.zeros = memoryview(bytes(WRITE_BLOCK_SIZE))
+
+        self.server = ThreadingHTTPServer((host, port), OriginRequestHandler)
+        self.server.daemon_threads = True
+        self.server.origin = self
+        self.thread = None
+
+    def get_mpd_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/{self.name}/{self.name}.mpd'
+
+    # it returns the segment size (bytes) of a path, or None if it doesn't exist
+    def get_segment_size(self, path):
+        match = SEGMENT_PATH.search(path)
+        if match is None:
+            return None
+
+        bandwidth, number = int(match.group(1)), int(match.group(2))
+        if bandwidth not in self.ladder or not 1 <= number <= self.segment_count:
+            return None
+
+        return round(bandwidth * self.segment_duration / 8)
+
+    def start(self):
+        # serves the requests in a background thread
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+class OriginRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        origin = self.server.origin
+
+        if origin.latency > 0:
+            time.sleep(origin.latency)
+
+        # absolute-form request targets (http://host/path) are accepted too
+        path = urlsplit(self.path).path
+
+        if path == f'/{origin.name}/{origin.name}.mpd':
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/dash+xml')
+            self.send_header('Content-Length', str(len(origin.mpd)))
+            self.end_headers()
+            self.write(origin.mpd)
+            return
+
+        size = origin.get_segment_size(path)
+        if size is None:
+            body = b'<html>404 Not Found</html>'
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+        while size > 0:
+            block = min(size, WRITE_BLOCK_SIZE)
+            self.write(origin.zeros[:block])
+            size -= block
+
+    def write(self, data):
+        origin = self.server.origin
+        started_time = time.perf_counter()
+        self.wfile.write(data)
+
+        # the connection rate limit: a block takes at least its transmission time
+        if origin.rate > 0:
+            waiting_time = 8 * len(data) / origin.rate - (time.perf_counter() - started_time)
+            if waiting_time > 0:
+                time.sleep(waiting_time)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='A local DASH origin server with a synthetic MPD.')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('--ladder', default=None, help='bitrates (bps) separated by commas')
+    arg_parser.add_argument('--segment-duration', type=float, default=1.0)
+    arg_parser.add_argument('--segment-count', type=int, default=600)
+    arg_parser.add_argument('--rate', type=float, default=0, help='per connection rate limit (bps)')
+    arg_parser.add_argument('--latency', type=float, default=0, help='delay (s) before each response')
+    arg_parser.add_argument('--name', default='synthetic')
+    args = arg_parser.parse_args()
+
+    ladder = [int(bandwidth) for bandwidth in args.ladder.split(',')] if args.ladder else None
+    origin = OriginServer(args.host, args.port, ladder, args.segment_duration, args.segment_count,
+                          args.rate, args.latency, args.name)
+
+    print(f'Serving {origin.get_mpd_url()}')
+    try:
+        origin.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
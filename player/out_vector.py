@@ -5,30 +5,62 @@
 @description: PyDash Project
 
 OutVector class stores all simulation statistics to be plot later.
+
+The samples are stored in two parallel arrays (time and value), 8 bytes per
+number instead of a list per sample. The values are floats by default, a
+different array typecode can be used for integer statistics (e.g. 'q').
+
+to_numpy() exports the arrays to NumPy without copying them. While the
+exported arrays are alive the OutVector can't grow (add() raises
+BufferError), so they should be used once the session has finished or be
+released before the next add().
 """
 
-import datetime
+from array import array
+
+import numpy as np
 
 
 class OutVector:
+    __slots__ = ('times', 'values')
 
-    def __init__(self):
-        self.items = []
+    def __init__(self, typecode='d'):
+        self.times = array('d')
+        self.values = array(typecode)
 
     def add(self, t, item):
-        self.items.append([t, item])
+        self.times.append(t)
+        self.values.append(item)
 
     def __len__(self):
-        return len(self.items)
+        return len(self.times)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return list(zip(self.times[key], self.values[key]))
+        return self.times[key], self.values[key]
+
+    def __iter__(self):
+        return zip(self.times, self.values)
 
     def __str__(self):
-        return self.items.__str__()
+        return list(self).__str__()
 
     def get_items(self):
-        return self.items
+        """
+        It returns the OutVector itself, a sequence of (time, value) tuples.
+        """
+        return self
+
+    def get_times(self):
+        return self.times
 
-    #def __getitem__(self, key):
-    #    if len(self.items) == 0:
-    #        return []
+    def get_values(self):
+        return self.values
 
-    #    return self.items[key]
+    def to_numpy(self):
+        """
+        It returns a tuple (times, values) of NumPy arrays sharing the memory of the OutVector.
+        """
+        return (np.frombuffer(self.times, dtype=self.times.typecode),
+                np.frombuffer(self.values, dtype=self.values.typecode))
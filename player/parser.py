@@ -6,9 +6,123 @@
 
 A mpd parser implementation to store and extract MDP information used
 during the simulation
+
+A MPD is parsed once: parse_mpd() keeps the parsed mpd_node of the last MPD
+files in a cache keyed by the hash of their content, so the modules of a
+session (and the sessions of a process) share the same mpd_node. It must be
+treated as read-only. The ConnectionHandler attaches it to the XML_RESPONSE
+message (see Message.get_parsed_mpd()).
+
+The attribute, representation id and bandwidth lookups are dict lookups.
+
+The MPD is read with iterparse and each Period is dropped from the XML tree
+as soon as it is parsed, so only the structures used by the player are kept
+(periods, adaptation sets, representations and a compact segment index per
+SegmentTemplate, see player.segment_index). parse_mpd_file() parses a MPD
+file from the disk with bounded memory.
+
+Audio and video adaptation sets are kept apart. The legacy accessors
+(get_adaptation_set_info(), get_segment_template(), get_qi(), ...) describe
+the main video adaptation set: the first one of the first Period.
 """
 
-from xml.etree.ElementTree import fromstring, ElementTree
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from xml.etree.ElementTree import iterparse
+
+from player.segment_index import SegmentIndex
+
+# number of parsed MPD files kept by parse_mpd()
+MPD_CACHE_SIZE = 16
+
+__mpd_cache = OrderedDict()
+__mpd_cache_lock = threading.Lock()
+
+
+class period_node:
+    __slots__ = ('attrib', 'base_url', 'segment_template', 'adaptation_sets')
+
+    def __init__(self, attrib):
+        self.attrib = attrib
+        self.base_url = None
+        # (attributes, timeline) of the Period SegmentTemplate
+        self.segment_template = None
+        self.adaptation_sets = []
+
+
+class adaptation_set_node:
+    __slots__ = ('attrib', 'period', 'base_url', 'segment_template', 'segment_index', 'representations',
+                 'content_type')
+
+    def __init__(self, attrib, period):
+        self.attrib = attrib
+        self.period = period
+        self.base_url = None
+        self.segment_template = None
+        self.segment_index = None
+        self.representations = []
+        self.content_type = None
+
+    def finish(self):
+        # video, audio, text... from contentType or from the mime type of the set or of its representations
+        content_type = self.attrib.get('contentType')
+        if content_type is None:
+            mime_type = self.attrib.get('mimeType')
+            if mime_type is None and self.representations:
+                mime_type = self.representations[0].attrib.get('mimeType')
+            content_type = mime_type.split('/')[0] if mime_type else 'video'
+        self.content_type = content_type
+
+        # the SegmentTemplate attributes are inherited from the Period
+        self.segment_index = build_segment_index(self.period.segment_template, self.segment_template)
+
+    def get_segment_template(self):
+        return merge_segment_template(self.period.segment_template, self.segment_template)[0]
+
+
+class representation_node:
+    __slots__ = ('attrib', 'adaptation_set', 'base_url', 'segment_template', 'own_segment_index')
+
+    def __init__(self, attrib, adaptation_set):
+        self.attrib = attrib
+        self.adaptation_set = adaptation_set
+        self.base_url = None
+        self.segment_template = None
+        self.own_segment_index = None
+
+    def finish(self):
+        if self.segment_template is not None:
+            self.own_segment_index = build_segment_index(self.adaptation_set.period.segment_template,
+                                                         self.adaptation_set.segment_template,
+                                                         self.segment_template)
+
+    # the representations without their own SegmentTemplate share the adaptation set index
+    def get_segment_index(self):
+        if self.own_segment_index is not None:
+            return self.own_segment_index
+        return self.adaptation_set.segment_index
+
+
+# it merges the SegmentTemplate (attributes, timeline) of the levels, the most specific one wins
+def merge_segment_template(*segment_templates):
+    attrib = {}
+    timeline = None
+    for segment_template in segment_templates:
+        if segment_template is not None:
+            attrib.update(segment_template[0])
+            if segment_template[1]:
+                timeline = segment_template[1]
+    return attrib, timeline
+
+
+def build_segment_index(*segment_templates):
+    attrib, timeline = merge_segment_template(*segment_templates)
+    if not attrib and not timeline:
+        return None
+    return SegmentIndex(attrib, timeline)
+
 
 class mpd_node:
     def __init__(self):
@@ -20,7 +134,46 @@ class mpd_node:
         self.title = ""
         self.segment_template = {}
         self.first_level_adp_set = {}
-            
+        self.base_url = None
+        self.periods = []
+        # lookup indexes, built on the first lookup
+        self.attribute_index = None
+        self.representation_index = None
+        self.qi = None
+        self.qi_index = None
+
+    def build_indexes(self):
+        # the first dict defining an attribute wins, as navigate_mpd() always did
+        self.attribute_index = {}
+        for data in (self.first_level_adp_set, self.segment_template, self.program_info_dict,
+                     self.period_dict, self.mpd_dict):
+            self.attribute_index.update(data)
+
+        self.representation_index = {}
+        for item in self.adaptation_set_list:
+            if 'id' in item:
+                self.representation_index.setdefault(item['id'], item)
+        for period in self.periods:
+            for adaptation_set in period.adaptation_sets:
+                for representation in adaptation_set.representations:
+                    if 'id' in representation.attrib:
+                        self.representation_index.setdefault(representation.attrib['id'], representation.attrib)
+
+        self.qi = sorted(int(i['bandwidth']) for i in self.adaptation_set_list)
+        self.qi_index = {}
+        for index, bandwidth in enumerate(self.qi):
+            self.qi_index.setdefault(bandwidth, index)
+
+    def get_attribute(self, attribute):
+        if self.attribute_index is None:
+            self.build_indexes()
+        return self.attribute_index.get(attribute)
+
+    def get_representation(self, representation_id):
+        if self.representation_index is None:
+            self.build_indexes()
+        return self.representation_index.get(representation_id)
+
     def add_mpd_info(self, data):
         self.mpd_dict = data
     
@@ -71,83 +224,177 @@ class mpd_node:
         return self.first_level_adp_set
 
     def get_qi(self):
-        handle_list = self.get_adaptation_set_info()
-        qi = [int(i['bandwidth']) for i in handle_list]
-        qi.sort()
-        return qi
+        if self.qi is None:
+            self.build_indexes()
+        return list(self.qi)
+
+    # return the index of a bandwidth (quality_id) in the qi list
+    def get_qi_index(self, bandwidth):
+        if self.qi_index is None:
+            self.build_indexes()
+        return self.qi_index[bandwidth]
+
+    # return the periods
+    def get_periods(self):
+        return self.periods
+
+    # return the adaptation sets of a period, only the ones of content_type (video, audio, ...) if it is given
+    def get_adaptation_sets(self, content_type=None, period=0):
+        if period >= len(self.periods):
+            return []
+        return [adaptation_set for adaptation_set in self.periods[period].adaptation_sets
+                if content_type is None or adaptation_set.content_type == content_type]
+
+    # return the main video adaptation set, the first one of the first period
+    def get_video_adaptation_set(self):
+        adaptation_sets = self.get_adaptation_sets('video') or self.get_adaptation_sets()
+        return adaptation_sets[0] if adaptation_sets else None
+
+    # return the segment duration (s) of the main video adaptation set, or None if it is not defined
+    def get_segment_duration(self):
+        adaptation_set = self.get_video_adaptation_set()
+        if adaptation_set is not None and adaptation_set.segment_index is not None:
+            return adaptation_set.segment_index.get_segment_duration()
+
+        segment_template = self.get_segment_template()
+        if 'duration' not in segment_template:
+            return None
+        return float(segment_template['duration']) / float(segment_template.get('timescale', 1))
+
+    # fills the legacy accessors with the main video adaptation set
+    def finish(self):
+        if self.periods:
+            self.add_period_info(self.periods[0].attrib)
 
-# mpd file parsing.
+        adaptation_set = self.get_video_adaptation_set()
+        if adaptation_set is not None:
+            self.add_first_level_adp_set(adaptation_set.attrib)
+            self.add_segment_template(adaptation_set.get_segment_template())
+            self.add_adaptation_set_info([representation.attrib for representation in adaptation_set.representations])
+
+# mpd file parsing, the parsed MPD files are cached by content.
 def parse_mpd(file_path):
+    key = hashlib.sha1(file_path.encode() if isinstance(file_path, str) else file_path).hexdigest()
+
+    with __mpd_cache_lock:
+        node = __mpd_cache.get(key)
+        if node is not None:
+            __mpd_cache.move_to_end(key)
+            return node
+
+    node = parse_mpd_content(file_path)
+    node.build_indexes()
+
+    with __mpd_cache_lock:
+        __mpd_cache[key] = node
+        while len(__mpd_cache) > MPD_CACHE_SIZE:
+            __mpd_cache.popitem(last=False)
+
+    return node
+
+
+def parse_mpd_content(file_path):
+    if isinstance(file_path, str):
+        file_path = file_path.encode()
+    return parse_mpd_stream(io.BytesIO(file_path))
+
+
+# mpd file parsing from the disk, the MPD is not cached.
+def parse_mpd_file(path):
+    with open(path, 'rb') as f:
+        node = parse_mpd_stream(f)
+    node.build_indexes()
+    return node
+
+
+def parse_mpd_stream(source):
     node = mpd_node()
-    adaptation_set = []
-
-    #tree = ET.parse(file_path)
-    tree = ElementTree(fromstring(file_path))
-
-    root = tree.getroot()
-
-    node.add_mpd_info(root.attrib)
-
-    # inside mpd
-    for child in root:
-        if child.tag == "{urn:mpeg:dash:schema:mpd:2011}ProgramInformation":
-            node.add_program_info(child.attrib)
-        elif child.tag == "{urn:mpeg:dash:schema:mpd:2011}Period":
-            node.add_period_info(child.attrib)
-        # inside program_information and period
-        for inside in child:
-            if inside.tag == "{urn:mpeg:dash:schema:mpd:2011}Title":
-                node.add_title(inside.text)
-            elif inside.tag == "{urn:mpeg:dash:schema:mpd:2011}AdaptationSet":
-                node.add_first_level_adp_set(inside.attrib)
-            # inside adaptation_set
-            for adp_set in inside:
-                if adp_set.tag == "{urn:mpeg:dash:schema:mpd:2011}SegmentTemplate":
-                    node.add_segment_template(adp_set.attrib)
-                else:
-                    adaptation_set.append(adp_set.attrib)
-    
-    node.add_adaptation_set_info(adaptation_set)
-        
+
+    root = None
+    # tags of the open elements
+    path = []
+    period = None
+    adaptation_set = None
+    representation = None
+    # (t, d, r) of the S elements of the open SegmentTimeline
+    timeline = None
+
+    for event, elem in iterparse(source, events=('start', 'end')):
+        tag = elem.tag.rsplit('}', 1)[-1]
+
+        if event == 'start':
+            path.append(tag)
+            if root is None:
+                root = elem
+                node.add_mpd_info(dict(elem.attrib))
+            elif tag == 'Period':
+                period = period_node(dict(elem.attrib))
+            elif tag == 'AdaptationSet':
+                adaptation_set = adaptation_set_node(dict(elem.attrib), period)
+            elif tag == 'Representation':
+                representation = representation_node(dict(elem.attrib), adaptation_set)
+            elif tag == 'SegmentTimeline':
+                timeline = []
+            continue
+
+        path.pop()
+        parent = path[-1] if path else None
+
+        if tag == 'S':
+            timeline.append((elem.get('t'), int(elem.get('d')), int(elem.get('r', 0))))
+            elem.clear()
+        elif tag == 'SegmentTemplate':
+            segment_template = (dict(elem.attrib), timeline)
+            timeline = None
+            if parent == 'Representation':
+                representation.segment_template = segment_template
+            elif parent == 'AdaptationSet':
+                adaptation_set.segment_template = segment_template
+            elif parent == 'Period':
+                period.segment_template = segment_template
+            elem.clear()
+        elif tag == 'BaseURL':
+            base_url = (elem.text or '').strip()
+            if parent == 'Representation':
+                representation.base_url = base_url
+            elif parent == 'AdaptationSet':
+                adaptation_set.base_url = base_url
+            elif parent == 'Period':
+                period.base_url = base_url
+            elif parent == 'MPD':
+                node.base_url = base_url
+        elif tag == 'Title':
+            node.add_title(elem.text)
+        elif tag == 'ProgramInformation':
+            node.add_program_info(dict(elem.attrib))
+        elif tag == 'Representation':
+            representation.finish()
+            adaptation_set.representations.append(representation)
+            representation = None
+            elem.clear()
+        elif tag == 'AdaptationSet':
+            adaptation_set.finish()
+            period.adaptation_sets.append(adaptation_set)
+            adaptation_set = None
+            elem.clear()
+        elif tag == 'Period':
+            node.periods.append(period)
+            period = None
+            # nothing parsed so far is needed from the XML tree
+            root.clear()
+
+    node.finish()
     return node
 
 # return the specific attribute value. 
 # if representation_id is passed, returns the correspondent dict.
 def navigate_mpd(mpd_node, attribute = None, representation_id = None):
-    handle_dict = {}
-    handle_list = []
-    
     if representation_id:
-        handle_list = mpd_node.get_adaptation_set_info()
-        for i, item in enumerate(handle_list):
-            if item['id'] == representation_id:
-                return item
-            
-    else:
-        handle_dict = mpd_node.get_mpd_info()
-        for key in handle_dict:
-            if attribute == key:
-                return(attribute, handle_dict[key])
-
-        handle_dict = mpd_node.get_period_info()
-        for key in handle_dict:
-            if attribute == key:
-                return(attribute, handle_dict[key])
-
-        handle_dict = mpd_node.get_program_info()
-        for key in handle_dict:
-            if attribute == key:
-                return(attribute, handle_dict[key])
-
-        handle_dict = mpd_node.get_segment_template()
-        for key in handle_dict:
-            if attribute == key:
-                return(attribute, handle_dict[key])
-
-        handle_dict = mpd_node.get_first_level_adp_set()
-        for key in handle_dict:
-            if attribute == key:
-                return(attribute, handle_dict[key])
+        return mpd_node.get_representation(representation_id)
+
+    value = mpd_node.get_attribute(attribute)
+    if value is not None:
+        return (attribute, value)
 
 '''
 exemplo = mpd_node()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+The Player buffer, stored as a queue of runs (qi, duration, enqueue time),
+one run per segment, instead of one list element per second of video.
+
+Durations are media time in float seconds, so segments of any duration
+(0.5 s, 2.5 s, ...) are stored as a single run. Segments are enqueued at
+the end and the video is played from the front, consuming exactly the
+requested media time even across segment boundaries; a run is removed as
+soon as it is completely played, so the memory used depends on the buffer
+size and not on the session length. Both operations are amortized O(1).
+
+As a sequence, the PlaybackBuffer is the QI of each second of video in the
+buffer (not played yet), from the next one to be played, as the old list
+of one QI per second. A second that spans two segments has the QI of the
+segment it starts in. The QIs already played are in the Player playback_qi
+statistic.
+"""
+
+import math
+from collections import deque
+
+# media time below it is considered played (float rounding)
+EPSILON = 1e-9
+
+
+class PlaybackBuffer:
+    __slots__ = ('runs', 'segment_count', 'stored', 'played')
+
+    def __init__(self):
+        # [qi, duration not played yet, enqueue time], from the oldest to the newest segment
+        self.runs = deque()
+        # number of segments ever stored
+        self.segment_count = 0
+
+        # media time (s) stored and played
+        self.stored = 0.0
+        self.played = 0.0
+
+    def append(self, qi, duration, enqueue_time):
+        self.runs.append([qi, duration, enqueue_time])
+        self.segment_count += 1
+        self.stored += duration
+
+    def pop(self, duration):
+        """
+        It plays up to 'duration' seconds of video and returns a list of (qi, media time
+        played, enqueue time) of each segment played.
+        """
+        played = []
+
+        while duration > EPSILON and self.runs:
+            run = self.runs[0]
+            amount = min(duration, run[1])
+            run[1] -= amount
+            duration -= amount
+            self.played += amount
+            played.append((run[0], amount, run[2]))
+
+            if run[1] <= EPSILON:
+                self.runs.popleft()
+
+        return played
+
+    def get_amount_to_play(self):
+        """
+        It returns the media time (s) stored and not played yet.
+        """
+        return round(self.stored - self.played, 9)
+
+    def get_segment_count(self):
+        """
+        It returns the number of segments ever stored (played or not).
+        """
+        return self.segment_count
+
+    def __len__(self):
+        amount = self.get_amount_to_play()
+        return math.ceil(amount - EPSILON) if amount > EPSILON else 0
+
+    def __getitem__(self, key):
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('buffer index out of range')
+
+        end = 0.0
+        for qi, duration, enqueue_time in self.runs:
+            end += duration
+            if key < end - EPSILON:
+                return qi
+
+    def __iter__(self):
+        position = 0
+        end = 0.0
+        for qi, duration, enqueue_time in self.runs:
+            end += duration
+            while position < end - EPSILON:
+                yield qi
+                position += 1
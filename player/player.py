@@ -13,15 +13,15 @@ import glob
 import os
 import threading
 import time
-from matplotlib import pyplot as plt
 
-from base.configuration_parser import ConfigurationParser
+from base.event_log import DEBUG
 from base.message import *
 from base.simple_module import SimpleModule
-from base.timer import Timer
 from player.out_vector import OutVector
+from player.playback_buffer import PlaybackBuffer
+from player.segment_template import SegmentURLBuilder
+from player.windowed_history import WindowedHistory
 from player.parser import *
-from base.whiteboard import Whiteboard
 
 '''
 quality_id - Taxa em que o video foi codificado (46980bps, ..., 4726737bps) 
@@ -35,15 +35,28 @@ Player is a Singleton class implementation
 
 class Player(SimpleModule):
 
-    def __init__(self, id):
-        SimpleModule.__init__(self, id)
+    def __init__(self, id, session=None):
+        SimpleModule.__init__(self, id, session)
 
-        config_parser = ConfigurationParser.get_instance()
+        config_parser = self.session.config_parser
 
-        self.buffering_until = int(config_parser.get_parameter('buffering_until'))
-        self.max_buffer_size = int(config_parser.get_parameter('max_buffer_size'))
-        self.playback_step = int(config_parser.get_parameter('playbak_step'))
+        # media time in seconds, fractions are allowed
+        self.buffering_until = float(config_parser.get_parameter('buffering_until'))
+        self.max_buffer_size = float(config_parser.get_parameter('max_buffer_size'))
+        self.playback_step = float(config_parser.get_parameter('playbak_step'))
         self.url_mpd = config_parser.get_parameter('url_mpd')
+        self.max_outstanding_requests = int(config_parser.get_parameter('max_outstanding_requests', 1))
+        self.results_dir = config_parser.get_parameter('results_dir', './results')
+        # number of playback_segment_size_time_at_buffer items kept
+        self.buffer_history_size = int(config_parser.get_parameter('buffer_history_size', 3600))
+
+        # a headless session doesn't plot the statistics (matplotlib is not even imported)
+        self.headless = bool(config_parser.get_parameter('headless', False))
+
+        # segment messages are reused once their responses are consumed
+        self.message_pool = None
+        if bool(config_parser.get_parameter('message_pool', False)):
+            self.message_pool = SSMessagePool()
 
         # last pause started at time
         self.pause_started_at = None
@@ -55,11 +68,27 @@ class Player(SimpleModule):
         # Does the player already started to download a segment?
         self.already_downloading = False
 
-        # buffer itself
-        self.buffer = []
+        # number of segments requested and not received yet (up to max_outstanding_requests)
+        self.segments_in_flight = 0
+
+        # size (s) of the last segment received
+        self.last_segment_size = 1
+
+        # segment duration (s) given by the MPD SegmentTemplate
+        self.segment_duration = None
 
-        # the buffer played position
-        self.buffer_played = 0
+        # is the download stopped until the buffer has room?
+        self.waiting_buffer_room = False
+
+        # was the last segment of the video already downloaded?
+        self.video_ended = False
+
+        # id of the first segment not found (the end of the video), the segments
+        # requested before it are still played
+        self.end_segment_id = None
+
+        # the buffer played position (media time in seconds)
+        self.buffer_played = 0.0
 
         # history of what was played in buffer
         self.playback_history = []
@@ -70,25 +99,44 @@ class Player(SimpleModule):
         self.parsed_mpd = ''
         self.qi = []
 
-        self.timer = Timer.get_instance()
+        # compiled segment urls of the MPD and the values shared by all segment requests
+        self.url_builder = None
+        # the SegmentTimeline of the main video adaptation set, if the MPD has one
+        self.segment_index = None
+        url_tokens = self.url_mpd.split('/')
+        self.segment_host_name = url_tokens[2]
+        self.segment_path_name = '/'.join(url_tokens[:len(url_tokens) - 1])
+        self.media_mpd = ''
+
+        self.timer = self.session.timer
 
         # threading playback
         self.playback_thread = threading.Thread(target=self.handle_video_playback)
         self.player_thread_events = threading.Event()
-        self.lock = threading.Lock()
+        # reentrant, the Whiteboard getters take it too
+        self.lock = threading.RLock()
         self.kill_playback_thread = False
 
         self.request_time = 0
 
-        self.playback_segment_size_time_at_buffer = []
-        self.playback_qi = OutVector()
-        self.playback_quality_qi = OutVector()
+        # segment id -> request time, of the segments being downloaded
+        self.request_times = {}
+
+        # time (s) the video of each playback step spent in the buffer before it was played,
+        # only the last buffer_history_size steps are kept
+        self.playback_segment_size_time_at_buffer = WindowedHistory(self.buffer_history_size)
+        self.playback_qi = OutVector('q')
+        self.playback_quality_qi = OutVector('q')
         self.playback_pauses = OutVector()
-        self.playback = OutVector()
+        self.playback = OutVector('q')
         self.playback_buffer_size = OutVector()
         self.throughput = OutVector()
 
-        self.whiteboard = Whiteboard.get_instance()
+        # buffer itself
+        self.buffer = PlaybackBuffer()
+
+        self.whiteboard = self.session.whiteboard
+        self.whiteboard.add_lock(self.lock)
         self.whiteboard.add_playback_history(self.playback.get_items())
         self.whiteboard.add_playback_qi(self.playback_qi.get_items())
         self.whiteboard.add_playback_pauses(self.playback_pauses.get_items())
@@ -98,16 +146,16 @@ class Player(SimpleModule):
         self.whiteboard.add_max_buffer_size(self.max_buffer_size)
 
     def get_qi(self, quality_qi):
-        return self.qi.index(quality_qi)
+        return self.parsed_mpd.get_qi_index(quality_qi)
 
     def get_amount_of_video_to_play_without_lock(self):
-        video_data = len(self.buffer) - self.buffer_played
+        video_data = self.buffer.get_amount_to_play()
         self.whiteboard.add_amount_video_to_play(video_data)
         return video_data
 
     def get_amount_of_video_to_play(self):
         self.lock.acquire()
-        video_data = len(self.buffer) - self.buffer_played
+        video_data = self.buffer.get_amount_to_play()
         self.lock.release()
         self.whiteboard.add_amount_video_to_play(video_data)
         return video_data
@@ -122,121 +170,174 @@ class Player(SimpleModule):
 
         return player_position
 
+    # number of segments stored in the buffer
     def get_buffer_size(self):
         self.lock.acquire()
-        bs = len(self.buffer)
+        bs = self.buffer.get_segment_count()
         self.lock.release()
         return bs
 
     # called function every time a segment was played
     def handle_video_playback(self):
-        while True:
-            self.lock.acquire()
-            current_time = self.timer.get_current_time()
-            buffer_size = self.get_amount_of_video_to_play_without_lock()
-            # print(f'{current_time} player acordou')
+        while self.play_video_step():
+            # playback steps
+            # print(f'{current_time} player vai dormir')
+            time.sleep(self.playback_step)
 
-            # there is something to play
-            if buffer_size > 0:
+    # plays a playback step. It returns False when the playback is finished.
+    def play_video_step(self):
+        resume_download = False
+
+        self.lock.acquire()
+        current_time = self.timer.get_current_time()
+        buffer_size = self.get_amount_of_video_to_play_without_lock()
+        # print(f'{current_time} player acordou')
+
+        # there is something to play
+        if buffer_size > 0:
+            # download is stopped waiting for room in the buffer
+            if self.waiting_buffer_room:
+                self.waiting_buffer_room = False
+
+                # using the virtual clock the next request is made by the playback step
+                if self.timer.is_virtual():
+                    resume_download = True
                 # player thread is sleeping.
-                if buffer_size >= self.max_buffer_size and not self.already_downloading:
-                    print(f'{current_time} Acordar Player Thread!')
+                else:
+                    self.event_log.debug('wake_up', '{time} Acordar Player Thread!')
                     self.player_thread_events.set()
-                    self.player_thread_events.clear()
 
-                for i in range(self.playback_step):
-                    qi = self.buffer[self.buffer_played]
-                    self.playback_qi.add(current_time, qi)
-                    self.playback_quality_qi.add(current_time, self.qi[qi])
-                    self.playback.add(current_time, 1)
+            # the playback step consumes exactly its media time, from one or more segments, and it
+            # is sampled once, with the segment that filled most of the step
+            played = self.buffer.pop(self.playback_step)
+            if played:
+                qi, duration, enqueue_time = max(played, key=lambda piece: piece[1])
+                self.playback_qi.add(current_time, qi)
+                self.playback_quality_qi.add(current_time, self.qi[qi])
+                self.playback.add(current_time, 1)
 
-                    # compute the difference time from writing to read the segment in the buffer
-                    #self.playback_segment_size_time_at_buffer[self.buffer_played] -= current_time
-                    self.playback_segment_size_time_at_buffer[self.buffer_played][1] = current_time
+                # compute the difference time from writing to read the segment in the buffer
+                self.playback_segment_size_time_at_buffer.append(round(current_time - enqueue_time, 6))
 
-                    self.buffer_played += 1
+            for piece in played:
+                self.buffer_played += piece[1]
 
-                buffer_size = self.get_amount_of_video_to_play_without_lock()
-                self.playback_buffer_size.add(current_time, buffer_size)
-                print(f'Execution Time {current_time} > buffer size: {buffer_size}')
+            buffer_size = self.get_amount_of_video_to_play_without_lock()
+            self.playback_buffer_size.add(current_time, buffer_size)
+            self.event_log.debug('buffer_size', 'Execution Time {time} > buffer size: {buffer_size}',
+                                 buffer_size=buffer_size)
+
+            if self.pause_started_at is not None:
+                # pause_time = (time.time_ns() - self.pause_started_at) * 1e-9
+                pause_time = current_time - self.pause_started_at
+                self.playback_pauses.add(current_time, pause_time)
+                self.pause_started_at = None
+        else:
+            # self.pause_started_at = time.time_ns()
+            self.playback.add(current_time, 0)
 
-                if self.pause_started_at is not None:
-                    # pause_time = (time.time_ns() - self.pause_started_at) * 1e-9
-                    pause_time = current_time - self.pause_started_at
-                    self.playback_pauses.add(current_time, pause_time)
-                    self.pause_started_at = None
-            else:
-                # self.pause_started_at = time.time_ns()
-                self.playback.add(current_time, 0)
+            if self.pause_started_at is None:
+                self.pauses_number += 1
+                self.pause_started_at = current_time
 
-                if self.pause_started_at is None:
-                    self.pauses_number += 1
-                    self.pause_started_at = current_time
+        # update buffer_size
+        buffer_size = self.get_amount_of_video_to_play_without_lock()
+        self.lock.release()
 
-            # update buffer_size
-            buffer_size = self.get_amount_of_video_to_play_without_lock()
-            self.lock.release()
+        if resume_download:
+            self.request_next_segments()
 
-            if (not threading.main_thread().is_alive() or self.kill_playback_thread) and buffer_size <= 0:
-                print(f'Execution Time {current_time}  thread {threading.get_ident()} will be killed.')
-                break
+        if (not threading.main_thread().is_alive() or self.kill_playback_thread) and buffer_size <= 0:
+            self.event_log.info('playback_ended', 'Execution Time {time}  thread {thread} will be killed.',
+                                thread=threading.get_ident())
+            return False
 
-            # playback steps
-            # print(f'{current_time} player vai dormir')
-            time.sleep(self.playback_step)
+        return True
+
+    def handle_self_message(self, msg):
+        # using the virtual clock, the playback is driven by scheduled events
+        if self.play_video_step():
+            self.send_self(msg, self.playback_step)
 
     def buffering_video_segment(self, msg):
         # buffer already stored the segment id
         buffer_size = self.get_buffer_size()
-        if buffer_size >= ((msg.get_segment_id() - 1) * msg.get_segment_size() + 1):
+        if buffer_size >= msg.get_segment_id():
             raise ValueError(f'buffer: {buffer_size}, {msg}')
 
         # adding the segment in the buffer
+        self.last_segment_size = msg.get_segment_size()
         self.store_in_buffer(self.get_qi(msg.get_quality_id()), msg.get_segment_size())
 
         # statistical purpose
         current_time = self.timer.get_current_time()
         buffer_size = self.get_amount_of_video_to_play()
         self.playback_buffer_size.add(current_time, buffer_size)
-        print(f'Execution Time {current_time} > buffer size: {buffer_size}')
+        self.event_log.debug('buffer_size', 'Execution Time {time} > buffer size: {buffer_size}', buffer_size=buffer_size)
 
         if self.buffer_initialization and self.get_amount_of_video_to_play() >= self.buffering_until:
             self.buffer_initialization = False
-            print(f'Execution Time {self.timer.get_current_time()} buffering process is concluded')
-            self.playback_thread.start()
+            self.event_log.info('buffering_concluded', 'Execution Time {time} buffering process is concluded')
+            if self.timer.is_virtual():
+                self.send_self(Message(MessageKind.SELF, 'playback'))
+            else:
+                self.playback_thread.start()
 
     def store_in_buffer(self, qi, segment_size):
         self.lock.acquire()
         current_time = self.timer.get_current_time()
 
-        for i in range(segment_size):
-            self.buffer.append(qi)
-
-            # logging the time the segment size was written in the buffer
-            self.playback_segment_size_time_at_buffer.append([current_time, -1])
+        # logging the time the segment was written in the buffer
+        self.buffer.append(qi, segment_size, current_time)
         self.lock.release()
 
+    # the buffer is full if the video to play and the segments being downloaded achieve the max buffer size
+    def is_buffer_full(self):
+        video_data = self.get_amount_of_video_to_play() + self.segments_in_flight * self.last_segment_size
+        return bool(video_data >= self.max_buffer_size)
+
+    # keeps up to max_outstanding_requests segments being downloaded while the buffer is not full
+    def request_next_segments(self):
+        # the end of the video is known
+        if self.end_segment_id is not None:
+            return
+
+        self.request_next_segment()
+
+        while self.segments_in_flight < self.max_outstanding_requests and not self.is_buffer_full():
+            self.request_next_segment()
+
     def request_next_segment(self):
-        if self.already_downloading:
+        if self.segments_in_flight >= self.max_outstanding_requests:
             raise ValueError('Something doesn\'t look right, a segment is already being downloaded!')
 
-        self.request_time = time.perf_counter()
-        # self.request_time = self.timer.get_current_time()
-        segment_request = SSMessage(MessageKind.SEGMENT_REQUEST)
-
-        url_tokens = self.url_mpd.split('/')
+        self.request_time = self.timer.get_current_time()
+        self.request_times[self.segment_id] = self.request_time
+        if self.message_pool is not None:
+            segment_request = self.message_pool.acquire(MessageKind.SEGMENT_REQUEST)
+        else:
+            segment_request = SSMessage(MessageKind.SEGMENT_REQUEST)
 
-        segment_request.add_host_name(url_tokens[2])
-        segment_request.add_path_name('/'.join(url_tokens[:len(url_tokens) - 1]))
-        segment_request.add_media_mpd(navigate_mpd(self.parsed_mpd, 'media')[1])
+        segment_request.add_host_name(self.segment_host_name)
+        segment_request.add_path_name(self.segment_path_name)
+        segment_request.add_media_mpd(self.media_mpd)
+        segment_request.add_url_builder(self.url_builder)
         segment_request.add_segment_id(self.segment_id)
+        if self.segment_index is not None:
+            segment_request.add_segment_duration(self.segment_index.get_duration(
+                self.segment_index.start_number + self.segment_id - 1))
+        else:
+            segment_request.add_segment_duration(self.segment_duration)
 
         self.segment_id += 1
 
         # set status to downloading a segment
+        self.segments_in_flight += 1
         self.already_downloading = True
 
-        print(f'Execution Time {self.timer.get_current_time()} > request: {segment_request}')
+        if self.event_log.is_enabled(DEBUG):
+            self.event_log.debug('segment_request', 'Execution Time {time} > request: {msg}', msg=segment_request,
+                                 segment_id=segment_request.get_segment_id())
 
         self.send_down(segment_request)
 
@@ -247,55 +348,139 @@ class Player(SimpleModule):
 
     def finalization(self):
 
-        print(f'Pauses number: {self.pauses_number}')
+        self.event_log.info('pauses', 'Pauses number: {pauses_number}', pauses_number=self.pauses_number)
+
+        if self.headless:
+            return
 
-        [os.remove(f) for f in glob.glob('./results/*.png')]
+        [os.remove(f) for f in glob.glob(os.path.join(self.results_dir, '*.png'))]
 
         self.logging_all_statistics()
 
     def handle_xml_response(self, msg):
-        self.parsed_mpd = parse_mpd(msg.get_payload())
+        self.parsed_mpd = msg.get_parsed_mpd()
         self.qi = self.parsed_mpd.get_qi()
-        self.request_next_segment()
+        self.segment_duration = self.parsed_mpd.get_segment_duration()
 
-    def handle_segment_size_response(self, msg):
+        # the segments of a SegmentTimeline have their own durations
+        adaptation_set = self.parsed_mpd.get_video_adaptation_set()
+        if adaptation_set is not None and adaptation_set.segment_index is not None \
+                and adaptation_set.segment_index.is_timeline():
+            self.segment_index = adaptation_set.segment_index
+        self.media_mpd = navigate_mpd(self.parsed_mpd, 'media')[1]
+        self.url_builder = SegmentURLBuilder(self.parsed_mpd, self.url_mpd)
+        self.request_next_segments()
 
+    def handle_segment_size_response(self, msg):
+        try:
+            self.consume_segment_size_response(msg)
+        finally:
+            # nobody uses the message after the Player
+            if self.message_pool is not None:
+                self.message_pool.release(msg)
+
+    def consume_segment_size_response(self, msg):
         # set status to not downloading a segment
-        self.already_downloading = False
+        self.segments_in_flight -= 1
+        self.already_downloading = bool(self.segments_in_flight > 0)
+        request_time = self.request_times.pop(msg.get_segment_id())
 
         current_time = self.timer.get_current_time()
-        print(f'Execution Time {current_time} > received: {msg}')
+        if self.event_log.is_enabled(DEBUG):
+            self.event_log.debug('segment_response', 'Execution Time {time} > received: {msg}', msg=msg,
+                                 segment_id=msg.get_segment_id(), quality_id=msg.get_quality_id(),
+                                 bit_length=msg.get_bit_length())
+
+        # segments requested after the last one (pipelined requests)
+        if self.video_ended:
+            return
 
-        if msg.found():
-            measured_throughput = msg.get_bit_length() / (time.perf_counter() - self.request_time)
-            self.throughput.add(current_time, measured_throughput)
+        if not msg.found():
+            if self.end_segment_id is None or msg.get_segment_id() < self.end_segment_id:
+                self.end_segment_id = msg.get_segment_id()
 
-            print(f'Execution Time {self.timer.get_current_time()} > measured throughput: {measured_throughput}')
+            # the segments before the end may still be downloading (pipelined requests)
+            if not self.is_downloading_before_end():
+                self.end_video()
+            return
 
-            # self.throughput.add(current_time, msg.get_bit_length() /(current_time - self.request_time))
-            self.buffering_video_segment(msg)
+        if self.end_segment_id is not None and msg.get_segment_id() > self.end_segment_id:
+            return
 
-            # still have space in buffer to download next ss
-            if self.get_amount_of_video_to_play() >= self.max_buffer_size:
-                print(
-                    f'Execution Time {current_time} Maximum buffer size is achieved... the principal process will sleep now.')
-                self.player_thread_events.wait()
+        measured_throughput = msg.get_bit_length() / (current_time - request_time)
+        self.throughput.add(current_time, measured_throughput)
 
-            self.request_next_segment()
+        self.event_log.debug('throughput', 'Execution Time {time} > measured throughput: {throughput}',
+                             throughput=measured_throughput)
 
-            '''
-            if not self.is_buffer_achieve_max_size():
-                self.request_next_segment()
-            else:
-                print('terminou o download... vamos encerrar')
-                self.kill_playback_thread = True
-                self.playback_thread.join()
-            '''
+        # self.throughput.add(current_time, msg.get_bit_length() /(current_time - self.request_time))
+        self.buffering_video_segment(msg)
+
+        # the end of the video is known, nothing else is requested
+        if self.end_segment_id is not None:
+            if not self.is_downloading_before_end():
+                self.end_video()
+            return
+
+        # still have space in buffer to download next ss
+        if self.is_buffer_full():
+            # the next segment response will check the buffer again
+            if self.segments_in_flight > 0:
+                return
+
+            self.event_log.debug('buffer_full', 'Execution Time {time} Maximum buffer size is achieved... '
+                                                'the principal process will sleep now.')
+
+            # using the virtual clock the next request is made by the playback step
+            if self.timer.is_virtual():
+                self.waiting_buffer_room = True
+                return
+
+            self.player_thread_events.clear()
+            self.waiting_buffer_room = True
+            self.player_thread_events.wait()
+
+        self.request_next_segments()
+
+        '''
+        if not self.is_buffer_achieve_max_size():
+            self.request_next_segment()
         else:
-            print(f'Execution Time {current_time} All video\'s segments was downloaded')
+            print('terminou o download... vamos encerrar')
             self.kill_playback_thread = True
-            if self.playback_thread.is_alive():
-                self.playback_thread.join()
+            self.playback_thread.join()
+        '''
+
+    # is a segment requested before the end of the video still being downloaded?
+    def is_downloading_before_end(self):
+        return any(segment_id < self.end_segment_id for segment_id in self.request_times)
+
+    def end_video(self):
+        self.video_ended = True
+        self.event_log.info('video_downloaded', 'Execution Time {time} All video\'s segments was downloaded')
+        self.kill_playback_thread = True
+        if self.playback_thread.is_alive():
+            self.playback_thread.join()
+
+    def get_session_summary(self):
+        """
+        It returns a dict with the main QoE statistics of the session.
+        """
+        qi = self.playback_qi.get_values()
+        pauses = self.playback_pauses.get_values()
+        throughput = self.throughput.get_values()
+
+        return {
+            'session_time': self.timer.get_current_time(),
+            # media time (s), a playback step may play less than playbak_step at the end
+            'played_time': round(self.buffer_played, 6),
+            'segments_downloaded': len(throughput),
+            'average_qi': sum(qi) / len(qi) if qi else 0,
+            'qi_switches': sum(1 for i in range(1, len(qi)) if qi[i] != qi[i - 1]),
+            'pauses_number': self.pauses_number,
+            'pauses_time': sum(pauses),
+            'average_throughput': sum(throughput) / len(throughput) if throughput else 0,
+        }
 
     def logging_all_statistics(self):
         self.log(self.playback_quality_qi, 'playback_quality_qi', 'Quality QI', 'bps')
@@ -306,23 +491,20 @@ class Player(SimpleModule):
         self.log(self.throughput, 'throughput', 'Throughput Variation', 'bps')
 
     def log(self, log, file_name, title, y_axis, x_axis='execution time (s)'):
-        items = log.items
-
-        if len(items) == 0:
+        if len(log) == 0:
             return
 
-        x = []
-        y = []
-        for i in range(len(items)):
-            x.append(items[i][0])
-            y.append(items[i][1])
+        # imported here, it takes most of the start up time of a session
+        from matplotlib import pyplot as plt
+
+        x, y = log.to_numpy()
 
         plt.plot(x, y, label=file_name)
         plt.xlabel(x_axis)
         plt.ylabel(y_axis)
         plt.title(title)
 
-        plt.savefig(f'./results/{file_name}.png')
+        plt.savefig(os.path.join(self.results_dir, f'{file_name}.png'))
         plt.clf()
         plt.cla()
         plt.close()
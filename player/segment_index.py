@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+The segment index of a DASH representation, built from its SegmentTemplate.
+
+A SegmentTemplate either defines a constant segment duration or has a
+SegmentTimeline. The timeline is kept as it is written in the MPD, one
+entry (start time, duration, repeat count) per S element, in compact
+arrays, so a live manifest with thousands of segments takes a few bytes
+per S element. The time of a segment is found with a bisect on the
+number of the first segment of each entry.
+
+Times and durations are in timescale units, as in the MPD.
+"""
+
+from array import array
+from bisect import bisect_right
+
+
+class SegmentIndex:
+    __slots__ = ('timescale', 'start_number', 'presentation_time_offset', 'duration', 'media', 'initialization',
+                 'starts', 'durations', 'repeats', 'first_numbers', 'open_ended')
+
+    def __init__(self, attrib, timeline=None):
+        self.timescale = int(attrib.get('timescale', 1))
+        self.start_number = int(attrib.get('startNumber', 1))
+        self.presentation_time_offset = int(attrib.get('presentationTimeOffset', 0))
+        self.duration = int(attrib['duration']) if 'duration' in attrib else None
+        self.media = attrib.get('media')
+        self.initialization = attrib.get('initialization')
+
+        # one item per S element of the timeline
+        self.starts = array('q')
+        self.durations = array('q')
+        self.repeats = array('q')
+        # index (from zero) of the first segment of each S element
+        self.first_numbers = array('q')
+        # the last S element repeats until the end of the period (r = -1)
+        self.open_ended = False
+
+        if timeline:
+            self.add_timeline(timeline)
+
+    def add_timeline(self, timeline):
+        """
+        timeline is a list of (t or None, d, r) of the S elements.
+        """
+        next_start = self.presentation_time_offset
+        next_number = 0
+
+        for i, (start, duration, repeat) in enumerate(timeline):
+            start = next_start if start is None else int(start)
+
+            # a negative repeat count lasts until the next S element (or the end of the period)
+            if repeat < 0:
+                if i + 1 < len(timeline) and timeline[i + 1][0] is not None:
+                    repeat = max((int(timeline[i + 1][0]) - start) // duration - 1, 0)
+                else:
+                    repeat = 0
+                    self.open_ended = True
+
+            self.starts.append(start)
+            self.durations.append(duration)
+            self.repeats.append(repeat)
+            self.first_numbers.append(next_number)
+
+            next_start = start + duration * (repeat + 1)
+            next_number += repeat + 1
+
+    def is_timeline(self):
+        return len(self.starts) > 0
+
+    def get_segment_count(self):
+        """
+        It returns the number of segments of the timeline, or None if it is not known
+        (constant duration or open-ended timeline).
+        """
+        if not self.is_timeline() or self.open_ended:
+            return None
+        return self.first_numbers[-1] + self.repeats[-1] + 1
+
+    def get_segment(self, number):
+        """
+        It returns a tuple (start time, duration) of the segment with the number
+        (the first segment is startNumber), in timescale units.
+        """
+        index = number - self.start_number
+        if index < 0:
+            raise IndexError(f'segment number {number} is smaller than startNumber')
+
+        if not self.is_timeline():
+            return self.presentation_time_offset + index * self.duration, self.duration
+
+        position = bisect_right(self.first_numbers, index) - 1
+        if not self.open_ended and index > self.first_numbers[position] + self.repeats[position]:
+            raise IndexError(f'segment number {number} is not in the timeline')
+
+        return (self.starts[position] + (index - self.first_numbers[position]) * self.durations[position],
+                self.durations[position])
+
+    def get_duration(self, number):
+        """
+        It returns the duration (s) of the segment with the number, or the nominal segment
+        duration if the segment is not in the timeline.
+        """
+        try:
+            return self.get_segment(number)[1] / self.timescale
+        except IndexError:
+            return self.get_segment_duration()
+
+    def get_segment_duration(self):
+        """
+        It returns the (nominal) segment duration in seconds, or None if it is not defined.
+        """
+        if self.duration is not None:
+            return self.duration / self.timescale
+        if self.is_timeline():
+            return self.durations[0] / self.timescale
+        return None
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+Compiled SegmentTemplate URLs.
+
+A URLTemplate is compiled once from a media or initialization template. The
+identifiers that don't change for a representation ($RepresentationID$,
+$Bandwidth$) and the BaseURL prefix are substituted at compile time; the
+ones that change for each segment ($Number$, $Time$, with or without a
+format tag such as $Number%05d$) become a printf-style format string, so
+rendering a segment URL is a single string formatting.
+
+A SegmentURLBuilder compiles the templates of every representation of the
+main video adaptation set of a parsed MPD. The BaseURL elements of the MPD,
+the Period, the AdaptationSet and the Representation are resolved against
+the MPD url. Segments are numbered from one by the Player; the number of
+the first segment of the template is startNumber.
+"""
+
+import re
+from urllib.parse import urljoin, urlsplit
+
+TEMPLATE_IDENTIFIER = re.compile(r'\$(RepresentationID|Number|Bandwidth|Time)?(%0?\d*[diuxXo])?\$')
+
+
+class URLTemplate:
+    __slots__ = ('format', 'fields')
+
+    def __init__(self, template, prefix='', **fixed):
+        pieces = [prefix.replace('%', '%%')]
+        fields = []
+        position = 0
+
+        for match in TEMPLATE_IDENTIFIER.finditer(template):
+            pieces.append(template[position:match.start()].replace('%', '%%'))
+            position = match.end()
+
+            identifier, format_tag = match.groups()
+            if identifier is None:
+                # $$ is an escaped $
+                pieces.append('$')
+            elif identifier in fixed:
+                value = fixed[identifier]
+                value = format_tag % value if format_tag and identifier != 'RepresentationID' else str(value)
+                pieces.append(value.replace('%', '%%'))
+            elif identifier in ('Number', 'Time'):
+                pieces.append(format_tag or '%d')
+                fields.append(identifier)
+            else:
+                raise ValueError(f'The template identifier ${identifier}$ has no value: {template}')
+
+        pieces.append(template[position:].replace('%', '%%'))
+
+        self.fields = tuple(fields)
+        self.format = ''.join(pieces)
+        if not self.fields:
+            self.format = self.format % ()
+
+    def uses_time(self):
+        return 'Time' in self.fields
+
+    def render(self, number=0, time=0):
+        if not self.fields:
+            return self.format
+        if len(self.fields) == 1:
+            return self.format % (number if self.fields[0] == 'Number' else time)
+        return self.format % tuple(number if field == 'Number' else time for field in self.fields)
+
+
+class RepresentationURLs:
+    __slots__ = ('host_name', 'media', 'initialization', 'segment_index')
+
+    def __init__(self, host_name, media, initialization, segment_index):
+        self.host_name = host_name
+        self.media = media
+        self.initialization = initialization
+        self.segment_index = segment_index
+
+
+class SegmentURLBuilder:
+
+    def __init__(self, parsed_mpd, mpd_url):
+        # bandwidth (quality_id) -> RepresentationURLs
+        self.representations = {}
+
+        adaptation_set = parsed_mpd.get_video_adaptation_set()
+        if adaptation_set is None:
+            return
+
+        base_url = mpd_url
+        for level in (parsed_mpd, adaptation_set.period, adaptation_set):
+            if level.base_url:
+                base_url = urljoin(base_url, level.base_url)
+
+        for representation in adaptation_set.representations:
+            segment_index = representation.get_segment_index()
+            if segment_index is None or segment_index.media is None:
+                continue
+
+            representation_url = urljoin(base_url, representation.base_url) if representation.base_url else base_url
+            fixed = {'RepresentationID': representation.attrib.get('id', ''),
+                     'Bandwidth': int(representation.attrib['bandwidth'])}
+
+            initialization = None
+            if segment_index.initialization is not None:
+                initialization = URLTemplate(segment_index.initialization,
+                                             self.get_prefix(representation_url, segment_index.initialization), **fixed)
+
+            self.representations.setdefault(fixed['Bandwidth'], RepresentationURLs(
+                urlsplit(representation_url).netloc,
+                URLTemplate(segment_index.media, self.get_prefix(representation_url, segment_index.media), **fixed),
+                initialization,
+                segment_index))
+
+    # the part of the base url the (relative) template is appended to
+    @staticmethod
+    def get_prefix(base_url, template):
+        if '://' in template:
+            return ''
+        if template.startswith('/'):
+            scheme, netloc = urlsplit(base_url)[:2]
+            return f'{scheme}://{netloc}'
+        return base_url[:base_url.rfind('/') + 1]
+
+    def get_host_name(self, bandwidth):
+        return self.representations[bandwidth].host_name
+
+    def get_media_url(self, bandwidth, segment_id):
+        """
+        It returns the url of the segment_id (from one) of the representation with the bandwidth.
+        """
+        representation = self.representations[bandwidth]
+        number = representation.segment_index.start_number + segment_id - 1
+
+        time = 0
+        if representation.media.uses_time():
+            time = representation.segment_index.get_segment(number)[0]
+
+        return representation.media.render(number, time)
+
+    def get_initialization_url(self, bandwidth):
+        initialization = self.representations[bandwidth].initialization
+        return initialization.render() if initialization is not None else None
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+@description: PyDash Project
+
+A statistic history that keeps only its last items, so a long session
+takes a constant amount of memory.
+
+Items are indexed from the first one ever appended, as in a list that only
+grows: len() is the number of items appended and the Whiteboard cursors
+(*_since()) keep working. Only the last 'size' items (at least) can be read,
+the older ones raise IndexError, and iterating yields the items kept. The
+dropped items are removed in blocks of 'size' items, so append() is
+amortized O(1).
+"""
+
+from array import array
+
+
+class WindowedHistory:
+    __slots__ = ('items', 'size', 'first_index')
+
+    def __init__(self, size, typecode='d'):
+        if size < 1:
+            raise ValueError(f'Invalid history size - {size}. It should be at least 1.')
+
+        self.items = array(typecode)
+        self.size = size
+        # index of items[0] since the first item appended
+        self.first_index = 0
+
+    def append(self, item):
+        self.items.append(item)
+
+        if len(self.items) >= 2 * self.size:
+            dropped = len(self.items) - self.size
+            del self.items[:dropped]
+            self.first_index += dropped
+
+    def get_first_index(self):
+        """
+        It returns the index of the oldest item still kept.
+        """
+        return self.first_index
+
+    def __len__(self):
+        return self.first_index + len(self.items)
+
+    def __getitem__(self, key):
+        if key < 0:
+            key += len(self)
+        if key < self.first_index:
+            raise IndexError(f'history index {key} was dropped, only the last {len(self.items)} items are kept')
+        return self.items[key - self.first_index]
+
+    def __iter__(self):
+        return iter(self.items)
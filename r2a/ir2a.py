@@ -13,16 +13,18 @@ It is necessary to implement all the @abstractmethod methods to generate a new R
 from base.simple_module import SimpleModule
 from abc import ABCMeta, abstractmethod
 from base.message import Message, MessageKind
-from base.whiteboard import Whiteboard
 
 
 class IR2A(SimpleModule):
 
-    def __init__(self, id):
-        SimpleModule.__init__(self, id)
+    def __init__(self, id, session=None):
+        SimpleModule.__init__(self, id, session)
 
         # Whiteboard object to change statistical information between Player and R2A algorithm
-        self.whiteboard = Whiteboard.get_instance()
+        self.whiteboard = self.session.whiteboard
+
+        # Timer object, it follows the configured clock (real or virtual)
+        self.timer = self.session.timer
 
     @abstractmethod
     def handle_xml_request(self, msg):
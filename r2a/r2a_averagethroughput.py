@@ -1,6 +1,5 @@
 from r2a.ir2a import IR2A
 from player.parser import *
-import time
 from statistics import mean
 
 
@@ -13,21 +12,21 @@ class R2A_AverageThroughput(IR2A):
         self.qi = []
 
     def handle_xml_request(self, msg):
-        self.request_time = time.perf_counter()
+        self.request_time = self.timer.get_current_time()
         self.send_down(msg)
 
     def handle_xml_response(self, msg):
 
-        parsed_mpd = parse_mpd(msg.get_payload())
+        parsed_mpd = msg.get_parsed_mpd()
         self.qi = parsed_mpd.get_qi()
 
-        t = time.perf_counter() - self.request_time
+        t = self.timer.get_current_time() - self.request_time
         self.throughputs.append(msg.get_bit_length() / t)
 
         self.send_up(msg)
 
     def handle_segment_size_request(self, msg):
-        self.request_time = time.perf_counter()
+        self.request_time = self.timer.get_current_time()
         avg = mean(self.throughputs) / 2
 
         selected_qi = self.qi[0]
@@ -39,7 +38,7 @@ class R2A_AverageThroughput(IR2A):
         self.send_down(msg)
 
     def handle_segment_size_response(self, msg):
-        t = time.perf_counter() - self.request_time
+        t = self.timer.get_current_time() - self.request_time
         self.throughputs.append(msg.get_bit_length() / t)
         self.send_up(msg)
 
@@ -28,7 +28,7 @@ class R2AFixed(IR2A):
 
     def handle_xml_response(self, msg):
         # getting qi list
-        self.parsed_mpd = parse_mpd(msg.get_payload())
+        self.parsed_mpd = msg.get_parsed_mpd()
         self.qi = self.parsed_mpd.get_qi()
 
         self.send_up(msg)
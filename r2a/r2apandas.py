@@ -13,7 +13,6 @@ An implementation example of a PANDAS Algorithm.
 from player.parser import *
 from r2a.ir2a import IR2A
 import numpy as np
-import time
 
 class r2aPandas(IR2A):
 
@@ -25,16 +24,16 @@ class r2aPandas(IR2A):
 
     def handle_xml_request(self, msg):
         #self.pandas.b(self.whiteboard.get_playback_buffer_size())
-        self.pandas.update_request(time.perf_counter())
+        self.pandas.update_request(self.timer.get_current_time())
         self.send_down(msg)
 
     def handle_xml_response(self, msg):
         # getting qi list
-        self.parsed_mpd = parse_mpd(msg.get_payload())
+        self.parsed_mpd = msg.get_parsed_mpd()
         self.pandas.qi = np.array(self.parsed_mpd.get_qi())
 
         #throughput do xml, primeiro throughput do algoritmo
-        self.pandas.td[0] = time.perf_counter() - self.pandas.trequest
+        self.pandas.td[0] = self.timer.get_current_time() - self.pandas.trequest
         self.pandas.z.append(msg.get_bit_length()/self.pandas.td[0])
         
         self.pandas.initpandas() # faz a iniciação dos valores do algoritmo após receber o mpd
@@ -43,11 +42,11 @@ class r2aPandas(IR2A):
     def handle_segment_size_request(self, msg):
         #msg.add_quality_id(self.pandas.get_quality())
         msg.add_quality_id(self.pandas.r[1])
-        self.pandas.update_request(time.perf_counter())
+        self.pandas.update_request(self.timer.get_current_time())
         self.send_down(msg)
 
     def handle_segment_size_response(self, msg):
-        self.pandas.update_response(time.perf_counter())
+        self.pandas.update_response(self.timer.get_current_time())
         #self.pandas.get_rate()
         self.send_up(msg)
 
@@ -16,6 +16,7 @@ In this algorithm the quality choice is made randomly.
 
 import random
 
+from base.event_log import DEBUG
 from player.parser import *
 from r2a.ir2a import IR2A
 
@@ -32,7 +33,7 @@ class R2ARandom(IR2A):
 
     def handle_xml_response(self, msg):
         # getting qi list
-        self.parsed_mpd = parse_mpd(msg.get_payload())
+        self.parsed_mpd = msg.get_parsed_mpd()
         self.qi = self.parsed_mpd.get_qi()
 
         self.send_up(msg)
@@ -42,7 +43,11 @@ class R2ARandom(IR2A):
         #random choosing approach
         qi_id = random.randint(0, len(self.qi)-1)
 
-        print(self.whiteboard.get_playback_history())
+        # only the last sample, printing the whole history made each request O(n)
+        if self.event_log.is_enabled(DEBUG):
+            history = self.whiteboard.get_playback_history()
+            self.event_log.debug('playback_history', 'playback history: {samples} samples, last: {last}',
+                                 samples=len(history), last=history[-1] if history else None)
 
         #list = self.whiteboard.get_playback_history()
         #if len(list) > 0: